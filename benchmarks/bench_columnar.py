@@ -0,0 +1,67 @@
+"""Memory used by a guild's users as pydantic `User` models vs the `UserTable` behind `GuildSettings.users`.
+
+Usage: python -m benchmarks.bench_columnar [--sizes 10000 100000 1000000] [--json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import tracemalloc
+
+from pevent.common.models import UserTable
+
+from .synthetic import make_users
+
+
+def measure(build) -> tuple[int, object]:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    obj = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, obj
+
+
+def run(sizes: list[int], distribution: str) -> list[dict]:
+    results = []
+    for size in sizes:
+        model_bytes, users = measure(lambda: dict(make_users(size, distribution)))
+
+        table_bytes, table = measure(lambda: UserTable.from_users(users))
+        results.append(
+            {
+                "users": size,
+                "distribution": distribution,
+                "model_bytes": model_bytes,
+                "table_bytes": table_bytes,
+                "table_column_bytes": table.nbytes(),
+                "ratio": round(model_bytes / table_bytes, 2),
+            }
+        )
+        del users, table
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--distribution", default="mixed")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.distribution)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'users':>10} {'User models':>14} {'UserTable':>14} {'per user':>16} {'ratio':>7}")
+    for r in results:
+        per_user = f"{r['model_bytes'] // r['users']}B / {r['table_bytes'] // r['users']}B"
+        print(f"{r['users']:>10} {r['model_bytes']:>14,} {r['table_bytes']:>14,} {per_user:>16} {r['ratio']:>6}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Load and dump times for the DB with and without the trusted fast path.
+
+Usage: python -m benchmarks.bench_serialization [--guilds 10] [--users 10000] [--json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from pevent.common.models import DB
+from pevent.common.snapshot import UserDumps
+
+from .synthetic import make_db
+
+
+def timed(func) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def run(guilds: int, users: int, distribution: str) -> dict:
+    db = make_db(guilds, users, distribution)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "db.json"
+        db.to_file(path)
+
+        validate, _ = timed(lambda: DB.from_file(path))
+
+        def lazy_load(trusted: bool) -> DB:
+            lazy = DB.from_file(path, lazy=True)
+            lazy._trusted = trusted
+            lazy.load_all()
+            return lazy
+
+        lazy_validate, _ = timed(lambda: lazy_load(False))
+        lazy_trusted, loaded = timed(lambda: lazy_load(True))
+        assert loaded.model_dump() == db.model_dump()
+
+        dump_model, _ = timed(lambda: db.model_dump_json())
+        fresh = DB.from_file(path)
+
+        def snapshot():
+            # Serializes what a writer thread would, so warm runs reuse the dumps
+            snap = fresh.snapshot()
+            for guild in snap.guilds.values():
+                if isinstance(guild, UserDumps):
+                    guild.result()
+            return snap
+
+        capture_cold, _ = timed(DB.from_file(path).snapshot)
+        snapshot_cold, _ = timed(snapshot)
+        snapshot_warm, _ = timed(snapshot)
+    return {
+        "guilds": guilds,
+        "users": users,
+        "distribution": distribution,
+        "load_validate": validate,
+        "load_lazy_validate": lazy_validate,
+        "load_lazy_trusted": lazy_trusted,
+        "dump_model_json": dump_model,
+        "capture_cold": capture_cold,
+        "snapshot_cold": snapshot_cold,
+        "snapshot_warm": snapshot_warm,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--guilds", type=int, default=10)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--distribution", default="mixed")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    result = run(args.guilds, args.users, args.distribution)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"{args.guilds} guilds x {args.users} users ({args.distribution})")
+    for key, value in result.items():
+        if isinstance(value, float):
+            print(f"{key:>20} {value * 1000:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""Load, save and lookup costs of every storage mode on synthetic databases.
+
+For each mode the database is written once, then loaded back (startup and full load), looked up
+user by user and saved after a handful of changes, the way `PEvent.save` flushes through the
+`SaveScheduler`. Meant as the baseline to compare any storage change against.
+
+Usage: python -m benchmarks.bench_storage [--guilds 10] [--users 10000] [--modes json sqlite] [--json] [--output FILE]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from pevent.common.models import DB
+from pevent.common.scheduler import SaveScheduler
+from pevent.common.storage import STORAGES, Storage
+
+from .synthetic import DISTRIBUTIONS, make_db
+
+
+class FsyncCounter:
+    """Counts `os.fsync` calls made from Python, syncs SQLite makes internally are not included"""
+
+    def __init__(self):
+        self.count = 0
+
+    @contextmanager
+    def counting(self) -> Iterator[FsyncCounter]:
+        fsync = os.fsync
+
+        def counted(fd):
+            self.count += 1
+            return fsync(fd)
+
+        os.fsync = counted
+        try:
+            yield self
+        finally:
+            os.fsync = fsync
+
+
+def timed(func) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def peak_memory(func) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    """Mean, median and p99 in microseconds"""
+    samples = sorted(samples)
+    return {
+        "mean_us": statistics.fmean(samples) * 1e6,
+        "p50_us": samples[len(samples) // 2] * 1e6,
+        "p99_us": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e6,
+    }
+
+
+def load(storage: Storage) -> DB:
+    db = storage.load()
+    storage.attach(db)
+    return db
+
+
+def load_all(db: DB) -> None:
+    if hasattr(db, "load_all"):
+        db.load_all()
+
+
+def bench_lookups(db: DB, guild_ids: list[int], users: int, count: int, rng: random.Random) -> dict:
+    samples = []
+    peeks = []
+    for _ in range(count):
+        gid = rng.choice(guild_ids)
+        uid = 10**17 + rng.randrange(users)
+        start = time.perf_counter()
+        db.get_conf(gid).get_user(uid)
+        samples.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        db.get_conf(gid).peek_user(uid + users)
+        peeks.append(time.perf_counter() - start)
+    return {"get_user": percentiles(samples), "peek_missing": percentiles(peeks)}
+
+
+async def flush(storage: Storage, db: DB) -> int:
+    """Same steps as `PEvent._flush`"""
+    guild_ids, write_global = db.take_dirty()
+    writer = await storage.prepare(db, guild_ids, write_global)
+    return await asyncio.to_thread(writer)
+
+
+def mutate(db: DB, guild_ids: list[int], users: int, changes: int, rng: random.Random) -> None:
+    gid = rng.choice(guild_ids)
+    conf = db.get_conf(gid)
+    for _ in range(changes):
+        conf.get_user(10**17 + rng.randrange(users)).user_total_setup += 1
+
+
+async def bench_saves(storage: Storage, db: DB, args: argparse.Namespace, rng: random.Random) -> dict:
+    guild_ids = list(db.configs)
+    counter = FsyncCounter()
+    times, written = [], []
+    with counter.counting():
+        for _ in range(args.saves):
+            mutate(db, guild_ids, args.users, args.changes, rng)
+            elapsed = time.perf_counter()
+            written.append(await flush(storage, db))
+            times.append(time.perf_counter() - elapsed)
+    result = {
+        "changes_per_save": args.changes,
+        "save": percentiles(times),
+        "bytes_per_save": statistics.fmean(written),
+        "fsyncs_per_save": counter.count / args.saves,
+    }
+
+    # A burst of commands through the write-behind scheduler, as `PEvent.save` issues them
+    async def flush_scheduled():
+        await flush(storage, db)
+
+    saver = SaveScheduler(flush_scheduled, delay=args.save_delay)
+    start = time.perf_counter()
+    for _ in range(args.saves):
+        mutate(db, guild_ids, args.users, args.changes, rng)
+        saver.request()
+        await asyncio.sleep(0)
+    await saver.close()
+    result["scheduler"] = {
+        "delay": args.save_delay,
+        "requested": saver.stats.requested,
+        "performed": saver.stats.performed,
+        "seconds": time.perf_counter() - start,
+    }
+    return result
+
+
+def bench_mode(mode: str, db: DB, args: argparse.Namespace) -> dict:
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        storage = STORAGES[mode](root)
+        counter = FsyncCounter()
+        with counter.counting():
+            write_time, written = timed(lambda: storage.write_all(db.snapshot()))
+        storage.close()
+        result = {
+            "mode": mode,
+            "write_all": {"seconds": write_time, "bytes": written, "fsyncs": counter.count},
+        }
+
+        def cold_load():
+            storage = STORAGES[mode](root)
+            return storage, load(storage)
+
+        startup, (storage, loaded) = timed(cold_load)
+        full, _ = timed(lambda: load_all(loaded))
+        storage.close()
+        result["load"] = {"startup_seconds": startup, "load_all_seconds": full}
+
+        def traced():
+            storage = STORAGES[mode](root)
+            load_all(load(storage))
+            storage.close()
+
+        result["load"]["peak_bytes"] = peak_memory(traced)
+
+        storage = STORAGES[mode](root)
+        loaded = load(storage)
+        load_all(loaded)
+        result["lookups"] = bench_lookups(loaded, list(db.configs), args.users, args.lookups, rng)
+        result.update(asyncio.run(bench_saves(storage, loaded, args, rng)))
+        storage.close()
+    return result
+
+
+def run(args: argparse.Namespace) -> dict:
+    db = make_db(args.guilds, args.users, args.distribution, args.seed)
+    return {
+        "config": {
+            "guilds": args.guilds,
+            "users": args.users,
+            "distribution": args.distribution,
+            "seed": args.seed,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+        },
+        "results": [bench_mode(mode, db, args) for mode in args.modes],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--guilds", type=int, default=10)
+    parser.add_argument("--users", type=int, default=10_000, help="Users per guild")
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="mixed")
+    parser.add_argument("--modes", nargs="+", choices=STORAGES, default=list(STORAGES))
+    parser.add_argument("--lookups", type=int, default=10_000)
+    parser.add_argument("--saves", type=int, default=20)
+    parser.add_argument("--changes", type=int, default=5, help="User changes before each save")
+    parser.add_argument("--save-delay", type=float, default=0.05, help="Scheduler delay for the burst test")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--output", type=Path, help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    config = report["config"]
+    print(f"{config['guilds']} guilds x {config['users']} users ({config['distribution']})")
+    header = f"{'mode':>8} {'write':>9} {'startup':>9} {'load all':>9} {'peak MB':>8} {'get_user':>9} {'save':>9} {'B/save':>10} {'fsync':>6}"
+    print(header)
+    for r in report["results"]:
+        print(
+            f"{r['mode']:>8} "
+            f"{r['write_all']['seconds'] * 1000:>7.1f}ms "
+            f"{r['load']['startup_seconds'] * 1000:>7.1f}ms "
+            f"{r['load']['load_all_seconds'] * 1000:>7.1f}ms "
+            f"{r['load']['peak_bytes'] / 2**20:>8.1f} "
+            f"{r['lookups']['get_user']['mean_us']:>7.1f}us "
+            f"{r['save']['mean_us'] / 1000:>7.2f}ms "
+            f"{r['bytes_per_save']:>10,.0f} "
+            f"{r['fsyncs_per_save']:>6.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Synthetic pevent data for the benchmarks, no Discord connection needed"""
+
+from __future__ import annotations
+
+import random
+from typing import Iterator
+
+from pevent.common.models import DB, GuildSettings, User, UserTable
+
+# Share of users that have ever hosted, the rest are left at their defaults
+DISTRIBUTIONS = {
+    # Most members only ever ran a read-only command
+    "sparse": 0.1,
+    "mixed": 0.5,
+    # Every member is an active host
+    "dense": 1.0,
+}
+
+
+def make_user(rng: random.Random, active: float) -> User:
+    if rng.random() >= active:
+        return User()
+    setup = rng.randint(1, 40)
+    complete = rng.randint(0, setup)
+    cancelled = setup - complete
+    withnotice = rng.randint(0, cancelled)
+    return User(
+        user_total_setup=setup,
+        user_total_complete=complete,
+        user_total_success=rng.randint(0, complete),
+        user_total_cancelled=cancelled,
+        user_total_cancelled_withnotice=withnotice,
+        user_total_cancelled_withoutnotice=cancelled - withnotice,
+        can_make_deposit=rng.random() < 0.2,
+        has_active_deposit=rng.random() < 0.05,
+        is_banned_from_host=rng.random() < 0.01,
+    )
+
+
+def make_users(count: int, distribution: str = "mixed", seed: int = 0) -> Iterator[tuple[int, User]]:
+    rng = random.Random(seed)
+    active = DISTRIBUTIONS[distribution]
+    for i in range(count):
+        yield 10**17 + i, make_user(rng, active)
+
+
+def make_db(guilds: int, users: int, distribution: str = "mixed", seed: int = 0) -> DB:
+    """`guilds` guilds of `users` users each"""
+    db = DB()
+    for g in range(guilds):
+        table = UserTable.from_users(dict(make_users(users, distribution, seed + g)))
+        db.configs[10**18 + g] = GuildSettings(users=table)
+    return db
@@ -1,4 +1,9 @@
+from redbot.core.utils import get_end_user_data_statement
+
 from .choosereact import ChooseReact
 
+__red_end_user_data_statement__ = get_end_user_data_statement(__file__)
+
+
 async def setup(bot):
     await bot.add_cog(ChooseReact(bot))
\ No newline at end of file
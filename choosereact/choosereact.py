@@ -1,48 +1,449 @@
+import asyncio
+import hashlib
+import logging
+import re
+import secrets
+import time
+from random import Random
+
 import discord
 from redbot.core import commands
-from random import sample
+from redbot.core.data_manager import cog_data_path
+from redbot.core.utils.chat_formatting import humanize_list, pagify
+
+from .filters import Eligibility
+from .index import ReactorIndex
+from .ledger import DELETED_USER, Draw, DrawLedger
+
+log = logging.getLogger("red.choosereact")
+
+# Reactions above which a status message shows the fetch progress
+PROGRESS_THRESHOLD = 500
+# Seconds between edits of the status message
+PROGRESS_INTERVAL = 2.0
+# Reaction lists `drawreact` fetches at once, discord.py holds the rest back for the rate limits anyway
+FETCH_CONCURRENCY = 4
+# Message IDs, channelID-messageID pairs and message links, anything else is taken as an emoji
+MESSAGE_REFERENCE = re.compile(r"^(?:\d+-)?\d+$|^https?://")
+
+
+class Reservoir:
+    """
+    Uniform pick of `count` user ids from a stream, holding only the picks (Algorithm R).
+    The same ids in the same order with the same seed always give the same picks, so a draw
+    over ids in ascending order (the order `reaction.users()` pages them in) can be replayed from its seed.
+    """
+
+    def __init__(self, count, seed):
+        self.count = count
+        self.rng = Random(seed)
+        self.picks = []
+        self.seen = 0
+        self._digest = hashlib.blake2b(digest_size=8)
+
+    def offer(self, user_id):
+        self._digest.update(user_id.to_bytes(8, "big"))
+        # The i-th candidate replaces a pick with probability count / i
+        if self.seen < self.count:
+            self.picks.append(user_id)
+        else:
+            slot = self.rng.randrange(self.seen + 1)
+            if slot < self.count:
+                self.picks[slot] = user_id
+        self.seen += 1
+
+    def winners(self):
+        # Picks from the first `count` candidates are still in arrival order
+        picks = list(self.picks)
+        self.rng.shuffle(picks)
+        return picks
+
+    def digest(self):
+        return self._digest.hexdigest()
+
+
+async def reservoir_sample(users, reservoir, on_progress=None, allowed=None):
+    """
+    Feed the non-bot users from the async iterator `users` to `reservoir` while they stream in,
+    only offering those `allowed` accepts if given.
+    """
+    async for user in users:
+        if user.bot or (allowed is not None and not allowed(user.id)):
+            continue
+        reservoir.offer(user.id)
+        if on_progress is not None:
+            await on_progress(reservoir.seen)
+    return reservoir
+
+
+def draw_label(draw):
+    return f"draw #{draw.id}" if draw is not None else "this draw could not be recorded"
+
+
+def mention(user_id):
+    return "deleted user" if user_id == DELETED_USER else f"<@{user_id}>"
+
+
+def sample_ids(user_ids, reservoir):
+    """Feed a set of user ids to `reservoir` in ascending order, matching a streamed draw"""
+    for user_id in sorted(user_ids):
+        reservoir.offer(user_id)
+    return reservoir
+
 
 class ChooseReact(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # Reactors of the messages opted in with `trackreact`, draws on them need no fetching
+        self.index = ReactorIndex()
+        # Every draw, its winners are left out of later draws on the same messages or within `recent=<days>`
+        self.ledger = DrawLedger(cog_data_path(self) / "draws.jsonl")
+
+    async def cog_load(self):
+        await asyncio.to_thread(self.ledger.load)
+
+    async def red_delete_data_for_user(self, *, requester, user_id):
+        # Draws stay in the log for audits, only the winner's id is removed from them
+        await self.ledger.forget_user(user_id)
+
+    async def record_draw(self, ctx, message_ids, emojis, match_all, seed, reservoir, winners, filters):
+        """Append the draw to the ledger, None if it could not be written. The winners are announced either way"""
+        draw = Draw(
+            guild_id=ctx.guild.id if ctx.guild else 0,
+            channel_id=ctx.channel.id,
+            message_ids=list(message_ids),
+            emojis=list(emojis),
+            match_all=match_all,
+            seed=seed,
+            candidates=reservoir.seen,
+            digest=reservoir.digest(),
+            winners=winners,
+            timestamp=time.time(),
+            filters=list(filters),
+        )
+        try:
+            return await self.ledger.record(draw)
+        except Exception as e:
+            log.exception(f"Failed to record a draw in {draw.guild_id}", exc_info=e)
+            return None
 
     @commands.command()
-    async def choosereact(self, ctx, message_id: int, emoji: str, count: int):
+    async def choosereact(self, ctx, message_id: int, emoji: str, count: int, *filters: str):
         """
         Randomly select X users who reacted to (emoji) on (message ID)
-        Usage: .choosereact <message_id> <emoji> <count>
-        Example: .choosereact 1316865261508493425 :white_check_mark: 3
+        Optional filters: role=<role>, joined=<days>, notbanned (not banned from hosting player events),
+        recent=<days> (did not win a draw in this server in that many days)
+        Usage: .choosereact <message_id> <emoji> <count> [filters...]
+        Example: .choosereact 1316865261508493425 :white_check_mark: 3 joined=30 notbanned
         """
+        eligibility = Eligibility()
         try:
-            # find the message using the message ID
-            message = await ctx.channel.fetch_message(message_id)
-        except discord.NotFound:
-            return await ctx.send("Message not found. Please provide a valid message ID.")
-        except discord.Forbidden:
-            return await ctx.send("I don't have permission to view that message.")
-        except discord.HTTPException:
-            return await ctx.send("An error occurred while fetching the message.")
+            for token in filters:
+                await eligibility.parse(ctx, token)
+            allowed = await eligibility.allowed(self.bot, ctx.guild, self.ledger)
+        except commands.BadArgument as e:
+            return await ctx.send(str(e))
+
+        seed = secrets.randbits(64)
+        reservoir = Reservoir(count, seed)
+        tracked = self.index.get(message_id)
+        # Like a fetched message, a tracked one only counts in the channel it was posted in
+        if tracked is not None and tracked.channel_id == ctx.channel.id:
+            user_ids = tracked.reactors.get(emoji)
+            if not user_ids:
+                return await ctx.send(f"No reactions with {emoji} were found on the specified message.")
+            if allowed is not None:
+                user_ids = {user_id for user_id in user_ids if allowed(user_id)}
+            sample_ids(user_ids, reservoir)
+            if reservoir.seen < count:
+                return await ctx.send(f"Not enough users reacted with {emoji}.")
+            winners = reservoir.winners()
+            draw = await self.record_draw(ctx, [message_id], [emoji], False, seed, reservoir, winners, filters)
+            user_mentions = ", ".join(f"<@{user_id}>" for user_id in winners)
+            return await ctx.send(
+                f"Randomly selected {count} user(s) who reacted with {emoji}: {user_mentions} ({draw_label(draw)})"
+            )
+
+        message = await self.fetch_message(ctx, message_id)
+        if message is None:
+            return
 
-        # Extract users who reacted with the given emoji
-        selected_users = []
+        # Sample the users who reacted with the given emoji as their pages arrive
+        status = None
         for reaction in message.reactions:
             if str(reaction.emoji) == emoji or reaction.emoji == emoji:
+                on_progress = None
+                if reaction.count > PROGRESS_THRESHOLD:
+                    status = await ctx.send(f"Fetching {reaction.count} reactions...")
+                    last_edit = time.monotonic()
+
+                    async def on_progress(seen):
+                        nonlocal last_edit
+                        if time.monotonic() - last_edit < PROGRESS_INTERVAL:
+                            return
+                        last_edit = time.monotonic()
+                        try:
+                            await status.edit(content=f"Fetching reactions... {seen}/{reaction.count}")
+                        except discord.HTTPException:
+                            pass
+
                 try:
-                    users = [user async for user in reaction.users() if not user.bot]
-                    if len(users) < count:
-                        return await ctx.send(f"Not enough users reacted with {emoji}.")
-                    selected_users = sample(users, count)
+                    await reservoir_sample(reaction.users(), reservoir, on_progress, allowed)
                 except discord.HTTPException:
-                    return await ctx.send("An error occurred while fetching the reactions.")
+                    return await self.reply(ctx, status, "An error occurred while fetching the reactions.")
+                if reservoir.seen < count:
+                    return await self.reply(ctx, status, f"Not enough users reacted with {emoji}.")
                 break
         else:
             return await ctx.send(f"No reactions with {emoji} were found on the specified message.")
 
         # Send the list of selected users
-        user_mentions = ", ".join(user.mention for user in selected_users)
-        await ctx.send(f"Randomly selected {count} user(s) who reacted with {emoji}: {user_mentions}")
+        winners = reservoir.winners()
+        draw = await self.record_draw(ctx, [message.id], [emoji], False, seed, reservoir, winners, filters)
+        user_mentions = ", ".join(f"<@{user_id}>" for user_id in winners)
+        await self.reply(
+            ctx, status, f"Randomly selected {count} user(s) who reacted with {emoji}: {user_mentions} ({draw_label(draw)})"
+        )
+
+    @commands.command()
+    @commands.guild_only()
+    async def drawreact(self, ctx, count: int, *targets: str):
+        """
+        Randomly select X users who reacted with any of several emojis on several messages
+        Messages can be IDs from this channel, channelID-messageID pairs or message links from this server.
+        Add *all* to only select users who reacted with every emoji on every message.
+        Users who already won a draw on one of the messages are left out.
+        Optional filters: role=<role>, joined=<days>, notbanned (not banned from hosting player events),
+        recent=<days> (did not win a draw in this server in that many days)
+        Usage: .drawreact <count> [all] <messages...> <emojis...> [filters...]
+        Example: .drawreact 3 1316865261508493425 1316865261508493426 :white_check_mark: :tada: role=Members
+        """
+        match_all = False
+        messages = {}
+        emojis = []
+        eligibility = Eligibility()
+        filters = []
+        for target in targets:
+            if target.lower() in ("any", "all"):
+                match_all = target.lower() == "all"
+            elif Eligibility.is_filter(target):
+                try:
+                    await eligibility.parse(ctx, target)
+                except commands.BadArgument as e:
+                    return await ctx.send(str(e))
+                filters.append(target)
+            elif MESSAGE_REFERENCE.match(target):
+                try:
+                    message = await commands.MessageConverter().convert(ctx, target)
+                except commands.BadArgument as e:
+                    return await ctx.send(str(e))
+                if message.guild != ctx.guild:
+                    # Links and channel-message pairs resolve in any server the bot is in
+                    return await ctx.send("Messages must be in this server.")
+                messages[message.id] = message
+            elif target not in emojis:
+                emojis.append(target)
+        if not messages or not emojis:
+            return await ctx.send("Please provide at least one message and one emoji.")
+        try:
+            allowed = await eligibility.allowed(self.bot, ctx.guild, self.ledger)
+        except commands.BadArgument as e:
+            return await ctx.send(str(e))
+
+        semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+        async def reactor_ids(message, emoji):
+            tracked = self.index.get(message.id)
+            if tracked is not None:
+                return tracked.reactors.get(emoji, set())
+            for reaction in message.reactions:
+                if str(reaction.emoji) == emoji or reaction.emoji == emoji:
+                    async with semaphore:
+                        return {user.id async for user in reaction.users() if not user.bot}
+            return set()
+
+        try:
+            groups = await asyncio.gather(*(reactor_ids(m, e) for m in messages.values() for e in emojis))
+        except discord.HTTPException:
+            return await ctx.send("An error occurred while fetching the reactions.")
+
+        # Both build a new set, the tracked sets are never modified here
+        candidates = set.intersection(*groups) if match_all else set().union(*groups)
+        candidates -= self.ledger.message_winners(messages)
+        if allowed is not None:
+            candidates = {user_id for user_id in candidates if allowed(user_id)}
+
+        seed = secrets.randbits(64)
+        reservoir = sample_ids(candidates, Reservoir(count, seed))
+        if reservoir.seen < count:
+            return await ctx.send("Not enough users reacted who have not already won.")
+
+        winners = reservoir.winners()
+        draw = await self.record_draw(ctx, messages, emojis, match_all, seed, reservoir, winners, filters)
+        user_mentions = ", ".join(f"<@{user_id}>" for user_id in winners)
+        await ctx.send(
+            f"Randomly selected {count} user(s) who reacted with {'all' if match_all else 'any'} of "
+            f"{' '.join(emojis)} on {len(messages)} message(s): {user_mentions} ({draw_label(draw)})"
+        )
+
+    @commands.group()
+    @commands.guild_only()
+    @commands.admin_or_permissions(manage_guild=True)
+    async def drawlog(self, ctx):
+        """
+        Look up past choosereact and drawreact draws in this server
+        """
+
+    @drawlog.command(name="recent")
+    async def drawlog_recent(self, ctx, days: float = 30.0):
+        """
+        List the draws of the last X days
+        Usage: .drawlog recent [days]
+        """
+        draws = self.ledger.recent(ctx.guild.id, since=time.time() - days * 86400)
+        if not draws:
+            return await ctx.send(f"No draws in the last {days:g} days.")
+        await self.send_draws(ctx, draws)
+
+    @drawlog.command(name="user")
+    async def drawlog_user(self, ctx, member: discord.Member):
+        """
+        List the draws a member has won
+        Usage: .drawlog user <member>
+        """
+        draws = self.ledger.wins(ctx.guild.id, member.id)
+        if not draws:
+            return await ctx.send(f"{member.display_name} has not won any draws.")
+        await self.send_draws(ctx, draws)
+
+    @drawlog.command(name="show")
+    async def drawlog_show(self, ctx, draw_id: int):
+        """
+        Show everything recorded about one draw, including the seed to replay it with
+        Usage: .drawlog show <draw_id>
+        """
+        draw = self.ledger.draws.get(draw_id)
+        if draw is None or draw.guild_id != ctx.guild.id:
+            return await ctx.send("No draw with that number in this server.")
+        await ctx.send(
+            f"**Draw #{draw.id}** on <t:{int(draw.timestamp)}:f> in <#{draw.channel_id}>\n"
+            f"Messages: {humanize_list([str(message_id) for message_id in draw.message_ids])}\n"
+            f"Emojis: {' '.join(draw.emojis)} ({'all' if draw.match_all else 'any'})\n"
+            f"Filters: {' '.join(draw.filters) or 'none'}\n"
+            f"Candidates: {draw.candidates} (digest `{draw.digest}`)\n"
+            f"Seed: `{draw.seed}`\n"
+            f"Winners: {', '.join(mention(user_id) for user_id in draw.winners)}",
+            allowed_mentions=discord.AllowedMentions.none(),
+        )
+
+    async def send_draws(self, ctx, draws):
+        lines = [
+            f"#{draw.id} <t:{int(draw.timestamp)}:d> {' '.join(draw.emojis)} - "
+            f"{', '.join(mention(user_id) for user_id in draw.winners)} of {draw.candidates}"
+            for draw in draws
+        ]
+        for page in pagify("\n".join(lines)):
+            await ctx.send(page, allowed_mentions=discord.AllowedMentions.none())
+
+    @commands.command()
+    @commands.guild_only()
+    @commands.admin_or_permissions(manage_guild=True)
+    async def trackreact(self, ctx, message_id: int):
+        """
+        Keep the reactors of a message in memory so later draws on it skip fetching them
+        Usage: .trackreact <message_id>
+        """
+        if message_id in self.index:
+            return await ctx.send("That message is already tracked.")
+        message = await self.fetch_message(ctx, message_id)
+        if message is None:
+            return
+
+        # Reactions made while the lists download are buffered and applied afterwards
+        self.index.start(message.id, message.channel.id)
+        reactors = {}
+        total = 0
+        try:
+            for reaction in message.reactions:
+                users = reactors[str(reaction.emoji)] = set()
+                async for user in reaction.users():
+                    if user.bot:
+                        continue
+                    users.add(user.id)
+                    total += 1
+                    if total > self.index.max_users:
+                        self.index.discard(message.id)
+                        return await ctx.send("That message has too many reactions to track.")
+        except discord.HTTPException:
+            self.index.discard(message.id)
+            return await ctx.send("An error occurred while fetching the reactions.")
+
+        if not self.index.finish(message.id, reactors):
+            return await ctx.send("That message has too many reactions to track.")
+        await ctx.send(f"Tracking {total} reaction(s) on that message.")
+
+    @commands.command()
+    @commands.guild_only()
+    @commands.admin_or_permissions(manage_guild=True)
+    async def untrackreact(self, ctx, message_id: int):
+        """
+        Stop keeping the reactors of a message in memory
+        Usage: .untrackreact <message_id>
+        """
+        if message_id not in self.index:
+            return await ctx.send("That message is not tracked.")
+        self.index.discard(message_id)
+        await ctx.send("No longer tracking that message.")
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        if payload.member is not None and payload.member.bot:
+            return
+        self.index.add(payload.message_id, str(payload.emoji), payload.user_id)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload):
+        self.index.remove(payload.message_id, str(payload.emoji), payload.user_id)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear(self, payload):
+        self.index.clear(payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear_emoji(self, payload):
+        self.index.clear(payload.message_id, str(payload.emoji))
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        self.index.discard(payload.message_id)
+
+    async def fetch_message(self, ctx, message_id):
+        """The message in this channel, None once the reason it could not be fetched was sent"""
+        # The bot's message cache first, it is kept current by the gateway, reactions included
+        message = discord.utils.find(lambda m: m.id == message_id, reversed(self.bot.cached_messages))
+        if message is not None and message.channel.id == ctx.channel.id:
+            return message
+        try:
+            # find the message using the message ID
+            return await ctx.channel.fetch_message(message_id)
+        except discord.NotFound:
+            await ctx.send("Message not found. Please provide a valid message ID.")
+        except discord.Forbidden:
+            await ctx.send("I don't have permission to view that message.")
+        except discord.HTTPException:
+            await ctx.send("An error occurred while fetching the message.")
+        return None
+
+    async def reply(self, ctx, status, content):
+        """Edit the outcome into the status message if there is one, otherwise send it"""
+        if status is not None:
+            try:
+                return await status.edit(content=content)
+            except discord.HTTPException:
+                pass
+        return await ctx.send(content)
 
 # Red Bot Setup
 async def setup(bot):
     cog = ChooseReact(bot)
-    await bot.add_cog(cog)
\ No newline at end of file
+    await bot.add_cog(cog)
@@ -0,0 +1,85 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from redbot.core import commands
+
+
+class Eligibility:
+    """
+    Who may be selected, evaluated once against the cached members of the guild.
+    Filter tokens: role=<role> (must have the role), joined=<days> (member for at least that many days),
+    notbanned (not banned from hosting player events, needs the PEvent cog),
+    recent=<days> (did not win a draw in the guild in that many days).
+    """
+
+    def __init__(self):
+        self.role = None
+        self.min_days = 0.0
+        self.exclude_banned = False
+        self.recent_days = 0.0
+
+    def __bool__(self):
+        return self.role is not None or self.min_days > 0 or self.exclude_banned
+
+    @staticmethod
+    def is_filter(token):
+        return token.lower() == "notbanned" or token.lower().startswith(("role=", "joined=", "recent="))
+
+    async def parse(self, ctx, token):
+        """Apply one filter token, raises commands.BadArgument if it is not valid"""
+        name, _, value = token.partition("=")
+        name = name.lower()
+        if name == "notbanned":
+            self.exclude_banned = True
+        elif name == "role":
+            self.role = await commands.RoleConverter().convert(ctx, value)
+        elif name in ("joined", "recent"):
+            try:
+                days = float(value)
+            except ValueError:
+                raise commands.BadArgument(f"`{value}` is not a number of days.")
+            if name == "joined":
+                self.min_days = days
+            else:
+                self.recent_days = days
+        else:
+            raise commands.BadArgument(f"Unknown filter `{token}`.")
+
+    async def eligible_ids(self, bot, guild):
+        """Ids of the members that pass every filter, None if there are no filters"""
+        if not self:
+            return None
+        if guild is None:
+            raise commands.BadArgument("Filters can only be used in a server.")
+        if self.exclude_banned:
+            pevent = bot.get_cog("PEvent")
+            if pevent is None or not pevent.ready.is_set():
+                raise commands.BadArgument("The PEvent cog is not loaded, `notbanned` cannot be checked.")
+        if not guild.chunked:
+            # One gateway request for the whole member list instead of a lookup per reactor
+            await guild.chunk()
+
+        members = self.role.members if self.role is not None else guild.members
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.min_days)
+        eligible = {
+            member.id
+            for member in members
+            if not member.bot and (not self.min_days or (member.joined_at is not None and member.joined_at <= cutoff))
+        }
+        if self.exclude_banned:
+            eligible -= pevent.flag_sets.members(guild.id, "is_banned_from_host")
+        return eligible
+
+    async def allowed(self, bot, guild, ledger):
+        """Check for whether a user id passes every filter, None if there are no filters"""
+        eligible = await self.eligible_ids(bot, guild)
+        excluded = set()
+        if self.recent_days:
+            if guild is None:
+                raise commands.BadArgument("Filters can only be used in a server.")
+            excluded = ledger.recent_winners(guild.id, since=time.time() - self.recent_days * 86400)
+        if eligible is None and not excluded:
+            return None
+        if eligible is None:
+            return lambda user_id: user_id not in excluded
+        return lambda user_id: user_id in eligible and user_id not in excluded
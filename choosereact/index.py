@@ -0,0 +1,121 @@
+from collections import OrderedDict
+
+
+class TrackedMessage:
+    __slots__ = ("channel_id", "reactors", "ready", "backlog")
+
+    def __init__(self, channel_id):
+        self.channel_id = channel_id
+        # str(emoji) -> ids of the non-bot users who reacted with it
+        self.reactors = {}
+        self.ready = False
+        # (emoji, user id, added) received while the reactors were still being fetched
+        self.backlog = []
+
+    def size(self):
+        return sum(len(users) for users in self.reactors.values())
+
+
+class ReactorIndex:
+    """
+    Reactors of opted-in messages, kept current from raw reaction events.
+    Least recently used messages are evicted once more than `max_messages` are tracked
+    or more than `max_users` reactors are held across all of them.
+    """
+
+    def __init__(self, max_messages=50, max_users=250_000):
+        self.max_messages = max_messages
+        self.max_users = max_users
+        self.messages = OrderedDict()
+        self.size = 0
+
+    def __contains__(self, message_id):
+        return message_id in self.messages
+
+    def __len__(self):
+        return len(self.messages)
+
+    def get(self, message_id):
+        """The tracked message if its reactors are ready, marking it as recently used"""
+        tracked = self.messages.get(message_id)
+        if tracked is None or not tracked.ready:
+            return None
+        self.messages.move_to_end(message_id)
+        return tracked
+
+    def start(self, message_id, channel_id):
+        """Begin tracking, events are buffered until `finish` hands over the fetched reactors"""
+        self.messages[message_id] = TrackedMessage(channel_id)
+        self._evict()
+
+    def finish(self, message_id, reactors):
+        """Install the fetched reactors and replay the buffered events, False if the caps evicted it"""
+        tracked = self.messages.get(message_id)
+        if tracked is None:
+            return False
+        tracked.reactors = reactors
+        if tracked.size() > self.max_users:
+            # Would evict everything else and still not fit
+            del self.messages[message_id]
+            return False
+        tracked.ready = True
+        self.size += tracked.size()
+        backlog, tracked.backlog = tracked.backlog, []
+        for emoji, user_id, added in backlog:
+            if added:
+                self.add(message_id, emoji, user_id)
+            else:
+                self.remove(message_id, emoji, user_id)
+        self._evict()
+        return message_id in self.messages
+
+    def discard(self, message_id):
+        tracked = self.messages.pop(message_id, None)
+        if tracked is not None and tracked.ready:
+            self.size -= tracked.size()
+
+    def add(self, message_id, emoji, user_id):
+        tracked = self.messages.get(message_id)
+        if tracked is None:
+            return
+        if not tracked.ready:
+            tracked.backlog.append((emoji, user_id, True))
+            return
+        users = tracked.reactors.setdefault(emoji, set())
+        if user_id not in users:
+            users.add(user_id)
+            self.size += 1
+            self._evict()
+
+    def remove(self, message_id, emoji, user_id):
+        tracked = self.messages.get(message_id)
+        if tracked is None:
+            return
+        if not tracked.ready:
+            tracked.backlog.append((emoji, user_id, False))
+            return
+        users = tracked.reactors.get(emoji)
+        if users is not None and user_id in users:
+            users.discard(user_id)
+            self.size -= 1
+            if not users:
+                del tracked.reactors[emoji]
+
+    def clear(self, message_id, emoji=None):
+        """Forget every reactor of the message, or only those of `emoji`"""
+        tracked = self.messages.get(message_id)
+        if tracked is None:
+            return
+        if not tracked.ready:
+            # The fetch may already hold users that were just cleared
+            self.discard(message_id)
+            return
+        emojis = list(tracked.reactors) if emoji is None else [emoji]
+        for key in emojis:
+            self.size -= len(tracked.reactors.pop(key, ()))
+
+    def _evict(self):
+        while self.messages and (len(self.messages) > self.max_messages or self.size > self.max_users):
+            message_id, tracked = self.messages.popitem(last=False)
+            if tracked.ready:
+                self.size -= tracked.size()
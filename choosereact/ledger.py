@@ -0,0 +1,133 @@
+import asyncio
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass, field
+
+log = logging.getLogger("red.choosereact.ledger")
+
+# Stands in for the winners whose data was deleted, so draws keep their number of winners
+DELETED_USER = 0
+
+
+@dataclass
+class Draw:
+    guild_id: int
+    channel_id: int
+    message_ids: list
+    emojis: list
+    match_all: bool
+    # Replaying `Reservoir(count, Random(seed))` over the candidate ids in ascending order gives the winners
+    seed: int
+    candidates: int
+    # Digest of the candidate ids in ascending order, to check a candidate list given for an audit
+    digest: str
+    winners: list
+    timestamp: float
+    id: int = 0
+    filters: list = field(default_factory=list)
+
+
+class DrawLedger:
+    """
+    Every draw, appended to a JSON lines file and indexed in memory by guild, by winner and by message.
+    Draws are appended in time order, so recent ones are found by walking an index from its end.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.draws = {}
+        self.by_guild = {}
+        self.by_winner = {}
+        self.by_message = {}
+        self.last_id = 0
+        self._lock = asyncio.Lock()
+
+    def load(self):
+        if not self.path.exists():
+            return
+        with self.path.open("rb") as fs:
+            for line in fs:
+                try:
+                    self._index(Draw(**json.loads(line)))
+                except (ValueError, TypeError) as e:
+                    # Most likely a torn write at the end of the file
+                    log.warning(f"Skipping bad draw record {line!r}", exc_info=e)
+
+    def _index(self, draw):
+        self.draws[draw.id] = draw
+        self.last_id = max(self.last_id, draw.id)
+        self.by_guild.setdefault(draw.guild_id, []).append(draw)
+        for user_id in draw.winners:
+            if user_id == DELETED_USER:
+                continue
+            self.by_winner.setdefault((draw.guild_id, user_id), []).append(draw)
+        for message_id in draw.message_ids:
+            self.by_message.setdefault(message_id, []).append(draw)
+
+    async def record(self, draw):
+        """Append the draw to the file under the next id, then index it. Raises if it could not be written"""
+        async with self._lock:
+            draw.id = self.last_id + 1
+            await asyncio.to_thread(self._append, self._line(draw))
+            self._index(draw)
+        return draw
+
+    @staticmethod
+    def _line(draw):
+        return (json.dumps(asdict(draw), ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+    def _append(self, data):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("ab") as fs:
+            start = fs.tell()
+            try:
+                fs.write(data)
+                fs.flush()
+                os.fsync(fs.fileno())
+            except Exception:
+                # Do not leave a torn line for the next draw to be appended to
+                fs.truncate(start)
+                raise
+
+    async def forget_user(self, user_id):
+        """Replace `user_id` among the winners of every draw and rewrite the file, returns how many draws changed"""
+        async with self._lock:
+            changed = [draw for draw in self.draws.values() if user_id in draw.winners]
+            if not changed:
+                return 0
+            for draw in changed:
+                draw.winners = [DELETED_USER if winner == user_id else winner for winner in draw.winners]
+            for key in [key for key in self.by_winner if key[1] == user_id]:
+                del self.by_winner[key]
+            data = b"".join(self._line(draw) for draw in self.draws.values())
+            await asyncio.to_thread(self._rewrite, data)
+        return len(changed)
+
+    def _rewrite(self, data):
+        temp = self.path.with_name(self.path.name + ".tmp")
+        with temp.open("wb") as fs:
+            fs.write(data)
+            fs.flush()
+            os.fsync(fs.fileno())
+        os.replace(temp, self.path)
+
+    def recent(self, guild_id, since=0.0, limit=None):
+        """Draws in the guild since `since`, newest first"""
+        found = []
+        for draw in reversed(self.by_guild.get(guild_id, [])):
+            if draw.timestamp < since or (limit is not None and len(found) >= limit):
+                break
+            found.append(draw)
+        return found
+
+    def recent_winners(self, guild_id, since):
+        return {user_id for draw in self.recent(guild_id, since) for user_id in draw.winners}
+
+    def message_winners(self, message_ids):
+        """Everyone who won a draw on any of the messages"""
+        return {user_id for message_id in message_ids for draw in self.by_message.get(message_id, []) for user_id in draw.winners}
+
+    def wins(self, guild_id, user_id):
+        """Draws the user won in the guild, newest first"""
+        return list(reversed(self.by_winner.get((guild_id, user_id), [])))
@@ -1,9 +1,17 @@
+import asyncio
 from abc import ABC, ABCMeta, abstractmethod
 
 from discord.ext.commands.cog import CogMeta
 from redbot.core.bot import Red
 
+from .common.expiry import DepositDeadlines
+from .common.history import HistoryStore
+from .common.indexes import FlagSets, Rankings
 from .common.models import DB
+from .common.prompts import PromptDispatcher
+from .common.scheduler import SaveScheduler
+from .common.storage import Storage
+from .common.transactions import BankLedger, UserLocks
 
 
 class CompositeMetaClass(CogMeta, ABCMeta):
@@ -15,8 +23,22 @@ class MixinMeta(ABC):
 
     def __init__(self, *_args):
         self.bot: Red
+        self.ready: asyncio.Event
         self.db: DB
+        self.saver: SaveScheduler
+        self.storage: Storage
+        self.rankings: Rankings
+        self.flag_sets: FlagSets
+        self.deposit_deadlines: DepositDeadlines
+        self.history: HistoryStore
+        self.user_locks: UserLocks
+        self.bank_ledger: BankLedger
+        self.prompts: PromptDispatcher
 
     @abstractmethod
     def save(self) -> None:
         raise NotImplementedError
+
+    @abstractmethod
+    async def set_storage(self, mode: str) -> int:
+        raise NotImplementedError
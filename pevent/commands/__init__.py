@@ -1,3 +1,4 @@
+import discord
 from discord.ext import commands
 from ..abc import CompositeMetaClass
 from .admin import Admin
@@ -7,6 +8,11 @@ from .user import User
 class Commands(Admin, User, metaclass=CompositeMetaClass):
     """Subclass all command classes"""
     
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        # Replies to pending confirmation prompts
+        self.prompts.dispatch(message)
+
     @commands.Cog.listener()
     async def on_command_error(self, ctx: commands.Context, error: commands.CommandError):
         if isinstance(error, commands.MemberNotFound):
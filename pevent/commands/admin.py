@@ -1,8 +1,19 @@
 import asyncio
+import io
+import json
+import math
+from typing import Union
+
 import discord
-from redbot.core import bank, commands
+from redbot.core import commands
+from redbot.core.utils.chat_formatting import box, pagify
 
 from ..abc import MixinMeta
+from ..common.history import HISTORY_WINDOW_DAYS, format_window
+from ..common.perf import PERF
+from ..common.replies import ReplyBuffer
+from ..common.storage import STORAGES
+from ..common.transactions import refund_key
 
 class Admin(MixinMeta):
     # Add field mapping as class constant
@@ -14,6 +25,10 @@ class Admin(MixinMeta):
         "withnotice": "user_total_cancelled_withnotice",
         "nonotice": "user_total_cancelled_withoutnotice"
     }
+    # Players shown per page of `pevent top` and the status listings
+    PAGE_SIZE = 10
+    # Bank calls a bulk command keeps in flight at once
+    BANK_CONCURRENCY = 5
 
     def reset_user_event_data(self, user_data):
         """Reset a user's event data to default values (0)."""
@@ -25,6 +40,7 @@ class Admin(MixinMeta):
         user_data.user_total_cancelled_withoutnotice = 0
         user_data.can_make_deposit = False
         user_data.has_active_deposit = False
+        user_data.last_deposit_at = 0
 
     @commands.group(name="pevent")
     @commands.admin_or_permissions(manage_guild=True)  # Only Admins can use this command
@@ -46,7 +62,7 @@ class Admin(MixinMeta):
         
         # Get user data from database
         guild_config = self.db.get_conf(ctx.guild)
-        user_data = guild_config.get_user(user)
+        user_data = guild_config.peek_user(user)
         
         # Create output message
         embed = discord.Embed(
@@ -66,10 +82,134 @@ class Admin(MixinMeta):
                         f"```",
             color=discord.Color.blue()
         )
+        window = self.history.window(ctx.guild.id, user.id)
+        embed.add_field(name=f"Last {HISTORY_WINDOW_DAYS} days", value=format_window(window), inline=False)
         embed.set_thumbnail(url=user.display_avatar.url)
         
         await ctx.send(embed=embed)
 
+    @pevent.command(name="top")
+    async def pevent_top(self, ctx: commands.Context, field: str, page: int = 1):
+        """-Rank players by one of their event statistics.-
+        Specify the field to rank by: *setup*, *complete*, *success*, *cancelled*, *withnotice*, *nonotice*,
+        or *rate* for the share of setups that were completed.
+        """
+        field = field.lower()
+        if field == "rate":
+            metric = "completion_rate"
+        elif field in self.FIELD_MAPPING:
+            metric = self.FIELD_MAPPING[field]
+        else:
+            valid_fields = ", ".join([*self.FIELD_MAPPING.keys(), "rate"])
+            await ctx.send(f"Invalid field. Valid fields are: {valid_fields}")
+            return
+
+        ranking = self.rankings.board(ctx.guild.id, metric)
+        if not len(ranking):
+            await ctx.send(f"Nobody has any {field} yet.")
+            return
+
+        pages = (len(ranking) + self.PAGE_SIZE - 1) // self.PAGE_SIZE
+        if page < 1 or page > pages:
+            await ctx.send(f"Page must be between 1 and {pages}.")
+            return
+
+        start = (page - 1) * self.PAGE_SIZE
+        lines = []
+        for rank, (uid, score) in enumerate(ranking.page(start, self.PAGE_SIZE), start=start + 1):
+            member = ctx.guild.get_member(uid)
+            name = member.display_name if member else f"Unknown ({uid})"
+            value = f"{score:.0%}" if field == "rate" else score
+            lines.append(f"{rank:>4}. {name[:24]:<24} {value:>6}")
+
+        embed = discord.Embed(
+            title=f"Top Players by {field}",
+            description="```\n" + "\n".join(lines) + "\n```",
+            color=discord.Color.blue()
+        )
+        embed.set_footer(text=f"Page {page}/{pages}")
+
+        await ctx.send(embed=embed)
+
+    async def send_user_page(self, ctx: commands.Context, title: str, uids: set[int], page: int):
+        """Send one page of a status listing, sorted by user id so pages stay stable"""
+        if not uids:
+            await ctx.send(f"No players are {title.lower()}.")
+            return
+
+        pages = (len(uids) + self.PAGE_SIZE - 1) // self.PAGE_SIZE
+        if page < 1 or page > pages:
+            await ctx.send(f"Page must be between 1 and {pages}.")
+            return
+
+        start = (page - 1) * self.PAGE_SIZE
+        lines = []
+        for uid in sorted(uids)[start : start + self.PAGE_SIZE]:
+            member = ctx.guild.get_member(uid)
+            lines.append(f"{member.display_name if member else 'Unknown'} ({uid})")
+
+        embed = discord.Embed(
+            title=f"Players {title}",
+            description="```\n" + "\n".join(lines) + "\n```",
+            color=discord.Color.blue()
+        )
+        embed.set_footer(text=f"Page {page}/{pages} - {len(uids)} total")
+
+        await ctx.send(embed=embed)
+
+    @pevent.command(name="summary")
+    async def pevent_summary(self, ctx: commands.Context, mode: str = ""):
+        """-Show server-wide player event totals.-
+        Use *verify* to recount them from every player first and report any that had drifted.
+        """
+        guild_config = self.db.get_conf(ctx.guild)
+        drift = None
+        if mode.lower() == "verify":
+            drift = guild_config.verify_stats()
+        elif mode:
+            await ctx.send("Usage: `[p]pevent summary [verify]`")
+            return
+
+        stats = guild_config.stats
+        embed = discord.Embed(
+            title=f"Player Event Summary for {ctx.guild.name}",
+            description=f"```\n"
+                        f"Setups:              {stats.setups}\n"
+                        f"Completions:         {stats.completions}\n"
+                        f"Successes:           {stats.successes}\n"
+                        f"Success Rate:        {stats.success_rate:.0%}\n"
+                        f"Cancellations:       {stats.cancellations}\n"
+                        f"----------------------\n"
+                        f"Active Deposits:     {stats.active_deposits}\n"
+                        # Only the current deposit value is known, deposits made before a `setdeposit` may differ
+                        f"Held (estimate):     {stats.active_deposits * self.db.deposit_value}\n"
+                        f"```",
+            color=discord.Color.blue()
+        )
+        if drift is not None:
+            lines = [f"{name}: {kept} -> {actual}" for name, (kept, actual) in drift.items()]
+            embed.set_footer(text="Recounted, corrected " + ", ".join(lines) if lines else "Recounted, no drift found")
+
+        await ctx.send(embed=embed)
+
+    @pevent.command(name="deposits")
+    async def pevent_deposits(self, ctx: commands.Context, page: int = 1):
+        """-List the players that currently hold a deposit.-"""
+        uids = self.flag_sets.members(ctx.guild.id, "has_active_deposit")
+        await self.send_user_page(ctx, "Holding a Deposit", uids, page)
+
+    @pevent.command(name="allowed")
+    async def pevent_allowed(self, ctx: commands.Context, page: int = 1):
+        """-List the players that are permitted to make a deposit.-"""
+        uids = self.flag_sets.members(ctx.guild.id, "can_make_deposit")
+        await self.send_user_page(ctx, "Permitted to Deposit", uids, page)
+
+    @pevent.command(name="banned")
+    async def pevent_banned(self, ctx: commands.Context, page: int = 1):
+        """-List the players that are banned from hosting events.-"""
+        uids = self.flag_sets.members(ctx.guild.id, "is_banned_from_host")
+        await self.send_user_page(ctx, "Banned from Hosting", uids, page)
+
     @pevent.command(name="add")
     async def pevent_add(self, ctx: commands.Context, user: discord.Member, field: str, quantity: int):
         """-Add to a player's event statistics.-
@@ -142,7 +282,7 @@ class Admin(MixinMeta):
         
         # Get user data from database
         guild_config = self.db.get_conf(ctx.guild)
-        user_data = guild_config.get_user(user)
+        user_data = guild_config.peek_user(user)
         
         # Create output message showing current stats before wiping
         embed = discord.Embed(
@@ -160,31 +300,28 @@ class Admin(MixinMeta):
         )
         embed.set_thumbnail(url=user.display_avatar.url)
         
-        await ctx.send(embed=embed)
-        
-        # Ask for confirmation
-        await ctx.send("Are you sure you want to wipe this User's data?")
+        # Ask for confirmation, in the same message as the current stats
+        async with ReplyBuffer(ctx) as replies:
+            await replies.ask("Are you sure you want to wipe this User's data?", embed=embed)
         
-        def check(message):
-            return message.author == ctx.author and message.channel == ctx.channel
-        
-        try:
-            response = await self.bot.wait_for('message', check=check, timeout=30.0)
-            response_text = response.content.strip()
+            try:
+                response = await self.prompts.wait(ctx.channel.id, ctx.author.id, timeout=30.0)
+                response_text = response.content.strip()
             
-            if response_text in ["Yes", "yes"]:
-                # Reset the user's data using helper function
-                self.reset_user_event_data(user_data)
+                if response_text in ["Yes", "yes"]:
+                    # Reset the user's data using helper function
+                    user_data = guild_config.get_user(user)
+                    self.reset_user_event_data(user_data)
                 
-                # Save the changes
-                self.save()
+                    # Save the changes
+                    self.save()
                 
-                await ctx.send("This User's information has been removed from the database.")
-            else:
-                await ctx.send("Cancelling wipe action.")
+                    replies.add("This User's information has been removed from the database.")
+                else:
+                    replies.add("Cancelling wipe action.")
                 
-        except asyncio.TimeoutError:
-            await ctx.send("Cancelling wipe action.")
+            except asyncio.TimeoutError:
+                replies.add("Cancelling wipe action.")
 
     @pevent.command(name="allow")
     async def pevent_allow(self, ctx: commands.Context, user: discord.Member = None):
@@ -230,6 +367,127 @@ class Admin(MixinMeta):
         
         await ctx.send(f"Deposit value has been set to {amount}.")
 
+    @pevent.command(name="expiry")
+    async def pevent_expiry(self, ctx: commands.Context, hours: float = None, action: str = None):
+        """-Set how long a deposit may stay active and what happens when it expires.-
+        *notify* reminds the server owner every time the period passes, *cancel* marks the event as cancelled
+        without notice and keeps the deposit. Use 0 hours to never expire deposits.
+        """
+        if hours is None:
+            if not self.db.deposit_expiry_hours:
+                await ctx.send("Deposits never expire.\n*Please provide a number of hours to set an expiry.*")
+                return
+            await ctx.send(
+                f"Deposits expire after {self.db.deposit_expiry_hours} hours ({self.db.deposit_expiry_action}).\n"
+                f"Deposits being tracked: {len(self.deposit_deadlines)}"
+            )
+            return
+
+        if not math.isfinite(hours) or hours < 0:
+            await ctx.send("Expiry must be 0 or a positive number of hours.")
+            return
+
+        if action is not None:
+            action = action.lower()
+            if action not in ("notify", "cancel"):
+                await ctx.send("Invalid action. Valid actions are: notify, cancel")
+                return
+            self.db.deposit_expiry_action = action
+
+        self.db.deposit_expiry_hours = hours
+
+        # Save the changes
+        self.save()
+
+        if not hours:
+            await ctx.send("Deposits will no longer expire.")
+            return
+        await ctx.send(f"Deposits will now expire after {hours} hours ({self.db.deposit_expiry_action}).")
+
+    @pevent.command(name="savedelay")
+    @commands.is_owner()
+    async def pevent_savedelay(self, ctx: commands.Context, seconds: float = None):
+        """-Set how many seconds of changes are batched into one save.-"""
+        stats = self.saver.stats
+        if seconds is None:
+            await ctx.send(
+                f"Current save delay: {self.db.save_delay}s\n"
+                f"Saves requested: {stats.requested}, performed: {stats.performed}, failed: {stats.failed}\n"
+                f"Flush latency: last {stats.last_latency * 1000:.1f}ms, "
+                f"avg {stats.avg_latency * 1000:.1f}ms, max {stats.max_latency * 1000:.1f}ms"
+            )
+            return
+
+        if not math.isfinite(seconds) or seconds < 0 or seconds > 60:
+            await ctx.send("Save delay must be between 0 and 60 seconds.")
+            return
+
+        self.db.save_delay = seconds
+        self.saver.delay = seconds
+
+        # Save the changes
+        self.save()
+
+        await ctx.send(f"Save delay has been set to {seconds}s.")
+
+    @pevent.command(name="storage")
+    @commands.is_owner()
+    async def pevent_storage(self, ctx: commands.Context, mode: str = None):
+        """-Switch how the event data is stored on disk.-
+        *json* keeps everything in one file, *sharded* keeps one file per server so only changed servers are rewritten,
+        *journal* appends each change to a log that is periodically folded into a snapshot,
+        *sqlite* keeps one row per user in a SQLite database and only loads users when they are needed.
+        """
+        valid_modes = ", ".join(STORAGES.keys())
+        if mode is None:
+            await ctx.send(f"Current storage mode: {self.storage.mode}\n*Valid modes are: {valid_modes}*")
+            return
+
+        mode = mode.lower()
+        if mode not in STORAGES:
+            await ctx.send(f"Invalid storage mode. Valid modes are: {valid_modes}")
+            return
+
+        if mode == self.storage.mode:
+            await ctx.send(f"Storage mode is already {mode}.")
+            return
+
+        async with ctx.typing():
+            written = await self.set_storage(mode)
+
+        await ctx.send(f"Storage mode has been set to {mode}. Migrated {written} bytes.")
+
+    @pevent.command(name="perf")
+    @commands.is_owner()
+    async def pevent_perf(self, ctx: commands.Context, action: str = None):
+        """-Show where the cog spends its time.-
+        *on* starts recording command, lookup, save and bank latencies, *off* stops, *reset* clears what was recorded,
+        *dump* uploads everything recorded as JSON.
+        """
+        if action is None:
+            status = "on" if PERF.enabled else "off"
+            report = PERF.report()
+            await ctx.send(f"Instrumentation is {status}.")
+            for page in pagify(report, page_length=1900):
+                await ctx.send(box(page))
+            return
+
+        action = action.lower()
+        if action == "on":
+            PERF.enable()
+            await ctx.send("Instrumentation enabled.")
+        elif action == "off":
+            PERF.disable()
+            await ctx.send("Instrumentation disabled, recorded data is kept until reset.")
+        elif action == "reset":
+            PERF.reset()
+            await ctx.send("Recorded data cleared.")
+        elif action == "dump":
+            data = json.dumps(PERF.dump(), indent=2).encode("utf-8")
+            await ctx.send(file=discord.File(io.BytesIO(data), filename="pevent-perf.json"))
+        else:
+            await ctx.send("Invalid action. Valid actions are: on, off, reset, dump")
+
     @pevent.command(name="complete")
     async def pevent_complete(self, ctx: commands.Context, user: discord.Member = None):
         """-Marks a Player's event as complete.-"""
@@ -241,42 +499,50 @@ class Admin(MixinMeta):
             await ctx.send("You cannot use this command on a bot.")
             return
         
-        # Get user data from database
         guild_config = self.db.get_conf(ctx.guild)
-        user_data = guild_config.get_user(user)
-
-        # Update the user's complete count
-        user_data.user_total_complete += 1
-        # Clear User's deposit.
-        user_data.has_active_deposit = False
-        # Set User's can_make_deposit to False
-        user_data.can_make_deposit = False
+        # The deposit this event refunds, if any
+        stamp = self.held_deposit(user)
         # Ask author if Success and update accordingly
-        await ctx.send(f"Event for {user.display_name} marked as complete and deposit has been refunded. Do you want to mark it as successful? (yes/no)")
-        
-        def check(message):
-            return message.author == ctx.author and message.channel == ctx.channel
+        async with ReplyBuffer(ctx) as replies:
+            await replies.ask(f"Event for {user.display_name} marked as complete and deposit has been refunded. Do you want to mark it as successful? (yes/no)")
 
-        try:
-            response = await self.bot.wait_for('message', check=check, timeout=30.0)
-            response_text = response.content.strip()
+            success = False
+            try:
+                response = await self.prompts.wait(ctx.channel.id, ctx.author.id, timeout=30.0)
+                success = response.content.strip().lower() in ["yes", "y"]
+                if not success:
+                    replies.add(f"Event for {user.display_name} not marked as successful.")
+            except asyncio.TimeoutError:
+                replies.add("No response received. Event not marked as successful.")
 
-            if response_text.lower() in ["yes", "y"]:
-                user_data.user_total_success += 1
-                await ctx.send(f"Event for {user.display_name} marked as successful.")
+            # Serialized with the deposit expiry and every other flow touching this user's deposit
+            async with self.user_locks(ctx.guild.id, user.id):
+                if self.held_deposit(user) != stamp:
+                    replies.clear()
+                    replies.add(f"The deposit of {user.display_name} changed while confirming. Nothing was recorded.")
+                    return
+                user_data = guild_config.get_user(user)
+                # Update the user's complete count
+                user_data.user_total_complete += 1
+                # Clear User's deposit.
+                user_data.has_active_deposit = False
+                # Set User's can_make_deposit to False
+                user_data.can_make_deposit = False
+                if success:
+                    user_data.user_total_success += 1
+                # Save the changes
+                self.save()
+
+            if success:
+                replies.add(f"Event for {user.display_name} marked as successful.")
                 # Refund the deposit
                 try:
-                    await bank.deposit_credits(user, self.db.deposit_value)
-                    await ctx.send(f"Refunded {self.db.deposit_value} to {user.display_name}.")
+                    if await self.refund_deposit(user, stamp):
+                        replies.add(f"Refunded {self.db.deposit_value} to {user.display_name}.")
+                    else:
+                        replies.add(f"{user.display_name} has no deposit left to refund.")
                 except Exception as e:
-                    await ctx.send(f"Failed to refund deposit: {e}")
-            else:
-                await ctx.send(f"Event for {user.display_name} not marked as successful.")
-
-        except asyncio.TimeoutError:
-            await ctx.send("No response received. Event not marked as successful.")
-        # Save the changes
-        self.save()
+                    replies.add(f"Failed to refund deposit: {e}")
 
     @pevent.command(name="cancel")
     async def pevent_cancel(self, ctx: commands.Context, user: discord.Member = None):
@@ -289,59 +555,65 @@ class Admin(MixinMeta):
             await ctx.send("You cannot use this command on a bot.")
             return
 
-        # Get user data from database
         guild_config = self.db.get_conf(ctx.guild)
-        user_data = guild_config.get_user(user)
-        # Update the user's cancelled count
-        user_data.user_total_cancelled += 1
+        # The deposit this event may refund, if any
+        stamp = self.held_deposit(user)
         # Ask if user wants to mark as cancelled with or without notice
-        await ctx.send(f"Event for {user.display_name} marked as cancelled. Did they give notice? (yes/no)")
-        def check(message):
-            return message.author == ctx.author and message.channel == ctx.channel
+        async with ReplyBuffer(ctx) as replies:
+            await replies.ask(f"Event for {user.display_name} marked as cancelled. Did they give notice? (yes/no)")
 
-        try:
-            response = await self.bot.wait_for('message', check=check, timeout=30.0)
-            response_text = response.content.strip()
+            notice = refund = None
+            try:
+                response = await self.prompts.wait(ctx.channel.id, ctx.author.id, timeout=30.0)
+                notice = response.content.strip().lower() in ["yes", "y"]
+                if notice:
+                    replies.add(f"Event for {user.display_name} marked as cancelled with notice.")
+                    # Ask if you want to refund the deposit
+                    await replies.ask(f"Do you want to refund the deposit for {user.display_name}? (yes/no)")
+                    try:
+                        response = await self.prompts.wait(ctx.channel.id, ctx.author.id, timeout=30.0)
+                        refund = response.content.strip().lower() in ["yes", "y"]
+                        if not refund:
+                            replies.add(f"No refund made for {user.display_name}.")
+                    except asyncio.TimeoutError:
+                        replies.add(f"No response received. The deposit of {user.display_name} is still held.")
+                else:
+                    replies.add(f"Event for {user.display_name} marked as cancelled without notice.")
+            except asyncio.TimeoutError:
+                replies.add("No response received. Event not marked as cancelled.")
 
-            if response_text.lower() in ["yes", "y"]:
-                user_data.user_total_cancelled_withnotice += 1
-                await ctx.send(f"Event for {user.display_name} marked as cancelled with notice.")
-                # Set User's can_make_deposit to False
-                user_data.can_make_deposit = False
-                # Ask if you want to refund the deposit
-                await ctx.send(f"Do you want to refund the deposit for {user.display_name}? (yes/no)")
-                
-                try:
-                    response = await self.bot.wait_for('message', check=check, timeout=30.0)
-                    response_text = response.content.strip()
-
-                    if response_text.lower() in ["yes", "y"]:
-                        # Refund the deposit
-                        await bank.deposit_credits(user, self.db.deposit_value)
-                        await ctx.send(f"Refunded {self.db.deposit_value} to {user.display_name}.")
+            # Serialized with the deposit expiry and every other flow touching this user's deposit
+            async with self.user_locks(ctx.guild.id, user.id):
+                if self.held_deposit(user) != stamp:
+                    replies.clear()
+                    replies.add(f"The deposit of {user.display_name} changed while confirming. Nothing was recorded.")
+                    return
+                user_data = guild_config.get_user(user)
+                # Update the user's cancelled count
+                user_data.user_total_cancelled += 1
+                if notice:
+                    user_data.user_total_cancelled_withnotice += 1
+                    # Set User's can_make_deposit to False
+                    user_data.can_make_deposit = False
+                    if refund is not None:
                         # Set user's has_active_deposit to False
                         user_data.has_active_deposit = False
-                        # Set user can_make_deposit to False
-                        user_data.can_make_deposit = False
+                elif notice is not None:
+                    user_data.user_total_cancelled_withoutnotice += 1
+                    user_data.has_active_deposit = False
+                # Save the changes
+                self.save()
+
+            if refund:
+                try:
+                    # Refund the deposit
+                    if await self.refund_deposit(user, stamp):
+                        replies.add(f"Refunded {self.db.deposit_value} to {user.display_name}.")
                     else:
-                        await ctx.send(f"No refund made for {user.display_name}.")
-                        # Set user's has_active_deposit to False
-                        user_data.has_active_deposit = False
-                        # Set user can_make_deposit to False
-                        user_data.can_make_deposit = False
+                        replies.add(f"{user.display_name} has no deposit left to refund.")
                 except Exception as e:
-                    await ctx.send(f"Failed to refund deposit: {e}")
-            else:
-                user_data.user_total_cancelled_withoutnotice += 1
-                user_data.has_active_deposit = False
-                await ctx.send(f"Event for {user.display_name} marked as cancelled without notice.")
-
-        except asyncio.TimeoutError:
-            await ctx.send("No response received. Event not marked as cancelled.")
-
-        # Save the changes
-        self.save()
-        await ctx.send(f"Event for {user.display_name} marked as cancelled.")
+                    replies.add(f"Failed to refund deposit: {e}")
+            replies.add(f"Event for {user.display_name} marked as cancelled.")
 
     @pevent.command(name="ban")
     async def pevent_ban(self, ctx: commands.Context, user: discord.Member = None):
@@ -385,6 +657,184 @@ class Admin(MixinMeta):
         # Save the changes
         self.save()
 
+    @pevent.group(name="bulk")
+    async def pevent_bulk(self, ctx: commands.Context):
+        """-Apply a command to several players at once.-
+        Each subcommand takes any mix of members and roles, a role stands for everyone who has it.
+        All changes are saved together.
+        """
+        pass
+
+    def resolve_targets(self, targets: tuple[Union[discord.Member, discord.Role], ...]) -> list[discord.Member]:
+        """Expand roles into their members, dropping bots and duplicates"""
+        members = {}
+        for target in targets:
+            for member in target.members if isinstance(target, discord.Role) else [target]:
+                if not member.bot:
+                    members[member.id] = member
+        return list(members.values())
+
+    def held_deposit(self, member: discord.Member) -> int | None:
+        """Stamp of the member's active deposit, None if they hold none"""
+        user_data = self.db.get_conf(member.guild).peek_user(member)
+        return user_data.last_deposit_at if user_data.has_active_deposit else None
+
+    async def refund_deposit(self, member: discord.Member, stamp: int | None) -> bool:
+        """Refund the deposit stamped `stamp`, at most once however many flows try. False if there is nothing to refund"""
+        if stamp is None:
+            return False
+        async with self.user_locks(member.guild.id, member.id):
+            key = refund_key(member.guild.id, member.id, stamp)
+            return await self.bank_ledger.deposit(key, member, self.db.deposit_value)
+
+    async def refund_many(self, refunds: list[tuple[discord.Member, int]]) -> tuple[int, list[discord.Member]]:
+        """Refund (member, deposit stamp) pairs, at most `BANK_CONCURRENCY` at a time.
+        Returns how many were refunded and the members whose refund failed.
+        """
+        semaphore = asyncio.Semaphore(self.BANK_CONCURRENCY)
+
+        async def refund(member: discord.Member, stamp: int) -> bool:
+            async with semaphore:
+                return await self.refund_deposit(member, stamp)
+
+        results = await asyncio.gather(*(refund(member, stamp) for member, stamp in refunds), return_exceptions=True)
+        refunded = sum(result is True for result in results)
+        return refunded, [member for (member, _), result in zip(refunds, results) if isinstance(result, Exception)]
+
+    @pevent_bulk.command(name="allow")
+    async def pevent_bulk_allow(self, ctx: commands.Context, *targets: Union[discord.Member, discord.Role]):
+        """-Permits several Players to make a deposit for an event.-"""
+        members = self.resolve_targets(targets)
+        if not members:
+            await ctx.send("Please specify at least one member or role. Usage: `[p]pevent bulk allow @user @role ...`")
+            return
+
+        guild_config = self.db.get_conf(ctx.guild)
+        for member in members:
+            guild_config.get_user(member).can_make_deposit = True
+
+        # Save the changes
+        self.save()
+
+        await ctx.send(f"Permitted {len(members)} players to make a deposit for an event.")
+
+    @pevent_bulk.command(name="ban")
+    async def pevent_bulk_ban(self, ctx: commands.Context, *targets: Union[discord.Member, discord.Role]):
+        """-Marks several Players as not allowed to Host events.-"""
+        members = self.resolve_targets(targets)
+        if not members:
+            await ctx.send("Please specify at least one member or role. Usage: `[p]pevent bulk ban @user @role ...`")
+            return
+
+        guild_config = self.db.get_conf(ctx.guild)
+        for member in members:
+            guild_config.get_user(member).is_banned_from_host = True
+
+        # Save the changes
+        self.save()
+
+        await ctx.send(f"{len(members)} players have been banned from hosting events.")
+
+    @pevent_bulk.command(name="unban")
+    async def pevent_bulk_unban(self, ctx: commands.Context, *targets: Union[discord.Member, discord.Role]):
+        """-Marks several Players as allowed to Host events again.-"""
+        members = self.resolve_targets(targets)
+        if not members:
+            await ctx.send("Please specify at least one member or role. Usage: `[p]pevent bulk unban @user @role ...`")
+            return
+
+        guild_config = self.db.get_conf(ctx.guild)
+        for member in members:
+            # Players that were never banned don't need a record
+            if guild_config.peek_user(member).is_banned_from_host:
+                guild_config.get_user(member).is_banned_from_host = False
+
+        # Save the changes
+        self.save()
+
+        await ctx.send(f"{len(members)} players have been unbanned from hosting events.")
+
+    @pevent_bulk.command(name="add")
+    async def pevent_bulk_add(
+        self,
+        ctx: commands.Context,
+        field: str,
+        quantity: int,
+        *targets: Union[discord.Member, discord.Role],
+    ):
+        """-Add to several players' event statistics.-
+        Specify the field to update: *setup*, *complete*, *success*, *cancelled*, *withnotice*, or *nonotice*.
+        """
+        if quantity <= 0:
+            await ctx.send("Quantity must be a positive number.")
+            return
+
+        if field.lower() not in self.FIELD_MAPPING:
+            valid_fields = ", ".join(self.FIELD_MAPPING.keys())
+            await ctx.send(f"Invalid field. Valid fields are: {valid_fields}")
+            return
+
+        members = self.resolve_targets(targets)
+        if not members:
+            await ctx.send("Please specify at least one member or role. Usage: `[p]pevent bulk add field quantity @user @role ...`")
+            return
+
+        guild_config = self.db.get_conf(ctx.guild)
+        attr_name = self.FIELD_MAPPING[field.lower()]
+        for member in members:
+            user_data = guild_config.get_user(member)
+            setattr(user_data, attr_name, getattr(user_data, attr_name) + quantity)
+
+        # Save the changes
+        self.save()
+
+        await ctx.send(f"Added {quantity} to the {field} count of {len(members)} players.")
+
+    @pevent_bulk.command(name="complete")
+    async def pevent_bulk_complete(
+        self,
+        ctx: commands.Context,
+        successful: bool,
+        *targets: Union[discord.Member, discord.Role],
+    ):
+        """-Marks several Players' events as complete.-
+        Pass *yes* to mark them all successful and refund the active deposits, or *no* to only mark them complete.
+        """
+        members = self.resolve_targets(targets)
+        if not members:
+            await ctx.send("Please specify at least one member or role. Usage: `[p]pevent bulk complete yes @user @role ...`")
+            return
+
+        guild_config = self.db.get_conf(ctx.guild)
+        refunds = []
+        for member in members:
+            user_data = guild_config.get_user(member)
+            if user_data.has_active_deposit:
+                refunds.append((member, user_data.last_deposit_at))
+            user_data.user_total_complete += 1
+            user_data.has_active_deposit = False
+            user_data.can_make_deposit = False
+            if successful:
+                user_data.user_total_success += 1
+
+        # Save the changes before the refunds, they can take a while
+        self.save()
+
+        if not successful:
+            await ctx.send(f"Events for {len(members)} players marked as complete, not marked as successful.")
+            return
+
+        async with ctx.typing():
+            refunded, failed = await self.refund_many(refunds)
+        await ctx.send(
+            f"Events for {len(members)} players marked as complete and successful. "
+            f"Refunded {self.db.deposit_value} to the {refunded} players holding a deposit."
+        )
+        if failed:
+            names = ", ".join(member.display_name for member in failed)
+            for page in pagify(f"Failed to refund deposit for: {names}"):
+                await ctx.send(page)
+
     @pevent.command(name="help")
     async def explain_pevent_process(self, ctx: commands.Context):
         """Command to explain the event process."""
@@ -1,8 +1,12 @@
 import discord
 from redbot.core import bank, commands
 import asyncio
+import time
 
 from ..abc import MixinMeta
+from ..common.history import HISTORY_WINDOW_DAYS, format_window
+from ..common.perf import PERF
+from ..common.transactions import deposit_key
 
 
 class User(MixinMeta):
@@ -11,7 +15,7 @@ class User(MixinMeta):
         """View your own player event statistics."""
         # Get user data from database
         guild_config = self.db.get_conf(ctx.guild)
-        user_data = guild_config.get_user(ctx.author)
+        user_data = guild_config.peek_user(ctx.author)
 
         # Check if user is banned from hosting
         if user_data.is_banned_from_host:
@@ -34,6 +38,8 @@ class User(MixinMeta):
                         f"```",
             color=discord.Color.blue(),
         )
+        window = self.history.window(ctx.guild.id, ctx.author.id)
+        embed.add_field(name=f"Last {HISTORY_WINDOW_DAYS} days", value=format_window(window), inline=False)
         embed.set_thumbnail(url=ctx.author.display_avatar.url)
 
         await ctx.send(embed=embed)
@@ -43,7 +49,7 @@ class User(MixinMeta):
         """Command to make a deposit."""
         # Get user data from database
         guild_config = self.db.get_conf(ctx.guild)
-        user_data = guild_config.get_user(ctx.author)
+        user_data = guild_config.peek_user(ctx.author)
 
         # Check if user is banned from hosting
         if user_data.is_banned_from_host:
@@ -61,7 +67,8 @@ class User(MixinMeta):
             return
 
         # Get user's bank balance
-        user_balance = await bank.get_balance(ctx.author)
+        with PERF.timer("bank.get_balance"):
+            user_balance = await bank.get_balance(ctx.author)
         deposit_amount = self.db.deposit_value
         
         # Check if user has enough balance
@@ -72,24 +79,39 @@ class User(MixinMeta):
         # Ask for confirmation
         await ctx.send(f"Are you sure you want to make a deposit of {deposit_amount}?")
         
-        def check(message):
-            return message.author == ctx.author and message.channel == ctx.channel
-        
         try:
-            response = await self.bot.wait_for('message', check=check, timeout=30.0)
+            response = await self.prompts.wait(ctx.channel.id, ctx.author.id, timeout=30.0)
             response_text = response.content.strip()
             
             if response_text.lower() in ["yes", "y"]:
-                # Deduct the amount from user's bank
-                await bank.withdraw_credits(ctx.author, deposit_amount)
-                
-                # Update user's deposit status
-                user_data.has_active_deposit = True
-                # Update user's Setup count
-                user_data.user_total_setup += 1
-                # Save the changes
-                self.save()
-                
+                # Serialized with every other flow touching this user's deposit
+                async with self.user_locks(ctx.guild.id, ctx.author.id):
+                    # Anything may have changed while we waited for the confirmation
+                    user_data = guild_config.peek_user(ctx.author)
+                    if user_data.is_banned_from_host or not user_data.can_make_deposit or user_data.has_active_deposit:
+                        await ctx.send("Your deposit status changed while confirming. No deposit was made.")
+                        return
+
+                    # Deduct the amount from user's bank, once per invoking message however often it is processed
+                    stamp = int(time.time())
+                    try:
+                        key = deposit_key(ctx.guild.id, ctx.author.id, ctx.message.id)
+                        if not await self.bank_ledger.withdraw(key, ctx.author, deposit_amount):
+                            await ctx.send("This deposit is already being made.")
+                            return
+                    except ValueError:
+                        await ctx.send(f"You do not have the required {deposit_amount} needed to make a deposit.")
+                        return
+
+                    # Update user's deposit status
+                    user_data = guild_config.get_user(ctx.author)
+                    user_data.has_active_deposit = True
+                    user_data.last_deposit_at = stamp
+                    # Update user's Setup count
+                    user_data.user_total_setup += 1
+                    # Save the changes
+                    self.save()
+
                 await ctx.send(f"Deposit of {deposit_amount} has been made successfully.")
             else:
                 await ctx.send("Deposit cancelled.")
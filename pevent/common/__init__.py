@@ -1,9 +1,14 @@
 from __future__ import annotations
 
+import gc
 import logging
 import os
+import re
+from contextlib import contextmanager
+from copy import copy
+from functools import cache, partial
 from pathlib import Path
-from typing import Any, Callable, Dict, Literal, Set, Type, TypeVar
+from typing import Any, Callable, Dict, Iterator, Literal, Set, Type, TypeVar
 from uuid import uuid4
 
 import typing_extensions
@@ -11,12 +16,17 @@ from pydantic import VERSION, BaseModel
 from pydantic.deprecated.parse import Protocol as DeprecatedParseProtocol
 from pydantic_core import PydanticUndefined
 
+from .perf import PERF
+
 Model = TypeVar("Model", bound="BaseModel")
 IncEx: typing_extensions.TypeAlias = (
     "Set[int] | Set[str] | Dict[int, Any] | Dict[str, Any] | None"
 )
 log = logging.getLogger("red.pevent")
 
+# Resolved once here instead of comparing version strings on every call
+PYDANTIC_V2 = tuple(int(part) for part in re.findall(r"\d+", VERSION)[:3]) >= (2, 0, 1)
+
 
 class Base(BaseModel):
     @classmethod
@@ -28,7 +38,7 @@ class Base(BaseModel):
         from_attributes: bool | None = None,
         context: dict[str, Any] | None = None,
     ) -> Model:
-        if VERSION >= "2.0.1":
+        if PYDANTIC_V2:
             return super().model_validate(
                 obj,
                 strict=strict,
@@ -51,7 +61,7 @@ class Base(BaseModel):
         proto: DeprecatedParseProtocol | None = None,
         allow_pickle: bool = False,
     ):
-        if VERSION >= "2.0.1":
+        if PYDANTIC_V2:
             return super().model_validate_json(
                 json_data,
                 strict=strict,
@@ -78,7 +88,7 @@ class Base(BaseModel):
         round_trip: bool = False,
         warnings: bool = True,
     ):
-        if VERSION >= "2.0.1":
+        if PYDANTIC_V2:
             return super().model_dump(
                 mode=mode,
                 include=include,
@@ -117,7 +127,7 @@ class Base(BaseModel):
         models_as_dict: bool = PydanticUndefined,
         **dumps_kwargs: Any,
     ):
-        if VERSION >= "2.0.1":
+        if PYDANTIC_V2:
             return super().model_dump_json(
                 indent=indent,
                 include=include,
@@ -147,30 +157,104 @@ class Base(BaseModel):
             raise FileNotFoundError(f"File not found: {path}")
         if not path.is_file():
             raise IsADirectoryError(f"Path is not a file: {path}")
-        if VERSION >= "2.0.1":
-            return cls.model_validate_json(path.read_bytes())
-        return cls.parse_file(path)
-
-    def to_file(self, path: Path) -> None:
-        dump = self.model_dump_json()
-        # We want to write the file as safely as possible
-        # https://github.com/Cog-Creators/Red-DiscordBot/blob/V3/develop/redbot/core/_drivers/json.py#L224
-        tmp_path = path.parent / f"{path.stem}-{uuid4().fields[0]}.tmp"
-        with tmp_path.open(encoding="utf-8", mode="w") as fs:
-            fs.write(dump)
-            fs.flush()  # This does get closed on context exit, ...
-            os.fsync(fs.fileno())  # but that needs to happen prior to this line
-
-        # Replace the original file with the new content
+        with paused_gc():
+            if PYDANTIC_V2:
+                return cls.model_validate_json(path.read_bytes())
+            return cls.parse_file(path)
+
+    def to_file(self, path: Path) -> int:
+        return write_atomic(path, self.model_dump_json())
+
+    @classmethod
+    def construct_trusted(cls: Type[Model], fields: dict[str, Any]) -> Model:
+        """Build an instance from data this cog wrote itself, skipping validation entirely.
+
+        Nested models must already be constructed by the caller.
+        """
+        if not PYDANTIC_V2:
+            return cls.construct(**fields)
+        defaults, private, needs_copy = _trusted_defaults(cls)
+        if needs_copy:
+            values = {name: copy(default) for name, default in defaults.items()}
+            private = {name: copy(default) for name, default in private.items()}
+        else:
+            values = defaults.copy()
+            private = private.copy()
+        values.update(fields)
+        obj = cls.__new__(cls)
+        _object_setattr(obj, "__dict__", values)
+        _object_setattr(obj, "__pydantic_fields_set__", set(fields))
+        _object_setattr(obj, "__pydantic_extra__", None)
+        _object_setattr(obj, "__pydantic_private__", private)
+        return obj
+
+
+_object_setattr = object.__setattr__
+
+
+@cache
+def _trusted_defaults(cls: Type[BaseModel]) -> tuple[dict[str, Any], dict[str, Any], bool]:
+    """Field and private attribute defaults for `construct_trusted`, and whether any of them needs copying"""
+    defaults = {name: field.get_default(call_default_factory=True) for name, field in cls.model_fields.items()}
+    private = {name: attr.get_default(call_default_factory=True) for name, attr in cls.__private_attributes__.items()}
+    mutable = (dict, list, set)
+    needs_copy = any(isinstance(default, mutable) for default in (*defaults.values(), *private.values()))
+    return defaults, private, needs_copy
+
+
+@cache
+def json_serializer(cls: Type[BaseModel]) -> Callable[[BaseModel], bytes]:
+    """Cached `instance -> JSON bytes` for `cls`, skipping the `model_dump_json` wrappers"""
+    if PYDANTIC_V2:
+        return partial(cls.__pydantic_serializer__.to_json, exclude_defaults=True)
+    return lambda model: model.json(exclude_defaults=True).encode("utf-8")
+
+
+@contextmanager
+def paused_gc() -> Iterator[None]:
+    """Pause the cyclic GC while building lots of objects that are all kept, which otherwise dominates load time"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def write_atomic(path: Path, dump: str | bytes, sync_dir: bool = True) -> int:
+    """Write `dump` to `path` via a temp file + rename, returns the number of bytes written.
+
+    Pass `sync_dir=False` when writing several files to the same directory and call `sync_directory` once after.
+    """
+    # We want to write the file as safely as possible
+    # https://github.com/Cog-Creators/Red-DiscordBot/blob/V3/develop/redbot/core/_drivers/json.py#L224
+    tmp_path = path.parent / f"{path.stem}-{uuid4().fields[0]}.tmp"
+    if isinstance(dump, str):
+        dump = dump.encode("utf-8")
+    with tmp_path.open(mode="wb") as fs:
+        written = fs.write(dump)
+        fs.flush()  # This does get closed on context exit, ...
+        os.fsync(fs.fileno())  # but that needs to happen prior to this line
+
+    # Replace the original file with the new content
+    try:
+        tmp_path.replace(path)
+    except FileNotFoundError as e:
+        log.error(f"Failed to rename {tmp_path} to {path}", exc_info=e)
+
+    if sync_dir:
+        sync_directory(path.parent)
+    PERF.record("write.bytes", written, unit="B")
+    PERF.count("write.bytes_total", written)
+    return written
+
+
+def sync_directory(directory: Path) -> None:
+    # Ensure directory fsync for better durability
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(directory, os.O_DIRECTORY)
         try:
-            tmp_path.replace(path)
-        except FileNotFoundError as e:
-            log.error(f"Failed to rename {tmp_path} to {path}", exc_info=e)
-
-        # Ensure directory fsync for better durability
-        if hasattr(os, "O_DIRECTORY"):
-            fd = os.open(path.parent, os.O_DIRECTORY)
-            try:
-                os.fsync(fd)
-            finally:
-                os.close(fd)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+import time
+from typing import Any, Iterable
+
+from .models import DB
+
+log = logging.getLogger("red.pevent.expiry")
+
+
+class DepositDeadlines:
+    """Min-heap of active deposit deadlines, fed by a DB listener.
+
+    Entries are (deadline, guild id, user id, deposit time). Entries whose deposit has since been
+    completed, cancelled or replaced are not removed eagerly, `pop_due` drops them when they surface.
+    """
+
+    def __init__(self):
+        self.db: DB | None = None
+        self.expiry = 0.0
+        self._heap: list[tuple[float, int, int, int]] = []
+        # Whether deposits made before the listener was attached are on the heap, only scanned for once expiry is on
+        self.scanned = False
+        # Deposits made before they were timestamped count from when tracking started
+        self._started = time.time()
+        self._wake = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def attach(self, db: DB) -> None:
+        self.detach()
+        self.db = db
+        db.add_listener(self._on_change)
+
+    def detach(self) -> None:
+        if self.db is not None:
+            self.db.remove_listener(self._on_change)
+            self.db = None
+        self._heap.clear()
+        self.scanned = False
+
+    def rebuild(self, deposits: Iterable[tuple[int, int, int]], expiry: float) -> None:
+        """Add the scanned `deposits` as (guild id, user id, deposit time) to the heap in one pass.
+
+        Deposits the listener pushed while the scan ran are kept, duplicates are dropped.
+        """
+        self.scanned = True
+        self._reheap({*((gid, uid, stamp) for _, gid, uid, stamp in self._heap), *deposits}, expiry)
+
+    def set_expiry(self, expiry: float) -> None:
+        """Move every deadline to the new expiry"""
+        self._reheap([(gid, uid, stamp) for _, gid, uid, stamp in self._heap], expiry)
+
+    def _reheap(self, deposits: Iterable[tuple[int, int, int]], expiry: float) -> None:
+        self.expiry = expiry
+        self._heap = [(self._deadline(stamp), gid, uid, stamp) for gid, uid, stamp in deposits]
+        heapq.heapify(self._heap)
+        self._wake.set()
+
+    def _deadline(self, stamp: int) -> float:
+        return (stamp or self._started) + self.expiry
+
+    def _on_change(self, gid: int | None, uid: int | None, field: str, old: Any, new: Any) -> None:
+        if field == "last_deposit_at" and new:
+            heapq.heappush(self._heap, (self._deadline(new), gid, uid, new))
+            self._wake.set()
+        elif field in ("deposit_expiry_hours", "deposit_expiry_action"):
+            self._wake.set()
+
+    def next_deadline(self) -> float | None:
+        if not self.expiry or not self._heap:
+            return None
+        return self._heap[0][0]
+
+    async def wait(self) -> None:
+        """Sleep until the next deadline, or until a deposit or the expiry setting changes"""
+        deadline = self.next_deadline()
+        timeout = None if deadline is None else max(0.0, deadline - time.time())
+        self._wake.clear()
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def pop_due(self, now: float) -> list[tuple[int, int, int]]:
+        """Remove and return (guild id, user id, deposit time) of the deposits that are past their deadline"""
+        due = []
+        if not self.expiry:
+            return due
+        while self._heap and self._heap[0][0] <= now:
+            _, gid, uid, stamp = heapq.heappop(self._heap)
+            try:
+                user = self.db.get_conf(gid).peek_user(uid)
+            except (OSError, ValueError) as e:
+                # A guild that fails to load is dropped from the heap rather than stopping every expiry
+                log.error(f"Could not load guild {gid} to expire the deposit of {uid}", exc_info=e)
+                continue
+            if user.has_active_deposit and user.last_deposit_at == stamp:
+                due.append((gid, uid, stamp))
+        return due
+
+    def remind_later(self, gid: int, uid: int, stamp: int) -> None:
+        """Schedule another reminder one expiry period from now"""
+        heapq.heappush(self._heap, (time.time() + self.expiry, gid, uid, stamp))
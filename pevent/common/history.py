@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+from . import write_atomic
+from .models import DB, User
+
+log = logging.getLogger("red.pevent.history")
+
+# Counter field -> event kind recorded when it goes up
+HISTORY_FIELDS = {name: name.removeprefix("user_total_") for name in User.model_fields if name.startswith("user_total_")}
+# Window shown by `pevent list` and `mypevents`
+HISTORY_WINDOW_DAYS = 30
+DAY = 86400
+ROLLUPS = "rollups.json"
+
+
+def partition_name(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("events-%Y-%m.jsonl")
+
+
+def format_window(counts: dict[str, int]) -> str:
+    """Code block of windowed counts for the statistics embeds"""
+    return (
+        f"```\n"
+        f"Setup:     {counts['setup']:<6} Complete:  {counts['complete']}\n"
+        f"Success:   {counts['success']:<6} Cancelled: {counts['cancelled']}\n"
+        f"```"
+    )
+
+
+class HistoryStore:
+    """Append-only event log partitioned by month, with per-guild daily rollups.
+
+    A DB listener turns every increase of a counter into an event row, folds it into the in-memory
+    rollups right away and queues the row for the next save, which only appends the rows. The rollups
+    are checkpointed much less often (`checkpoint`) with the byte offset up to which each partition is
+    included, so rows appended since the last checkpoint are replayed on load. `compact` deletes
+    partitions that are fully checkpointed and older than `raw_retention_days`, and `expire_rollups`
+    drops rollups older than `rollup_retention_days`, which keeps the store bounded.
+    """
+
+    raw_retention_days = 90
+    rollup_retention_days = 400
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        # Guild id -> day number -> user id -> event kind -> count
+        self.rollups: dict[int, dict[int, dict[int, dict[str, int]]]] = {}
+        # Partition file name -> bytes appended to it
+        self.offsets: dict[str, int] = {}
+        # Partition file name -> bytes of it folded into the last checkpoint
+        self.checkpointed: dict[str, int] = {}
+        self.db: DB | None = None
+        self._pending: list[dict[str, Any]] = []
+        # Rollups changed since the last checkpoint
+        self._changed = False
+
+    def attach(self, db: DB) -> None:
+        self.detach()
+        self.db = db
+        db.add_listener(self._on_change)
+
+    def detach(self) -> None:
+        if self.db is not None:
+            self.db.remove_listener(self._on_change)
+            self.db = None
+
+    def _on_change(self, gid: int | None, uid: int | None, field: str, old: Any, new: Any) -> None:
+        kind = HISTORY_FIELDS.get(field)
+        if kind is None or gid is None or new <= old:
+            return
+        self.record(time.time(), gid, uid, kind, new - old)
+
+    def record(self, ts: float, gid: int, uid: int, kind: str, count: int = 1) -> None:
+        self._pending.append({"t": ts, "g": gid, "u": uid, "e": kind, "n": count})
+        self._fold(ts, gid, uid, kind, count)
+        self._changed = True
+
+    def _fold(self, ts: float, gid: int, uid: int, kind: str, count: int) -> None:
+        users = self.rollups.setdefault(gid, {}).setdefault(int(ts // DAY), {})
+        counts = users.setdefault(uid, {})
+        counts[kind] = counts.get(kind, 0) + count
+
+    def window(self, gid: int, uid: int, days: int = HISTORY_WINDOW_DAYS, now: float | None = None) -> dict[str, int]:
+        """Event counts of one user over the last `days` days, read from the rollups only"""
+        totals = dict.fromkeys(HISTORY_FIELDS.values(), 0)
+        guild = self.rollups.get(gid)
+        if not guild:
+            return totals
+        today = int((now or time.time()) // DAY)
+        for day in range(today - days + 1, today + 1):
+            counts = guild.get(day, {}).get(uid)
+            if counts:
+                for kind, count in counts.items():
+                    totals[kind] = totals.get(kind, 0) + count
+        return totals
+
+    def load(self) -> None:
+        """Read the persisted rollups, then replay whatever the partitions hold past their offsets"""
+        path = self.directory / ROLLUPS
+        if path.exists():
+            try:
+                data = json.loads(path.read_bytes())
+                self.rollups = {
+                    int(gid): {
+                        int(day): {int(uid): counts for uid, counts in users.items()} for day, users in days.items()
+                    }
+                    for gid, days in data["rollups"].items()
+                }
+                self.offsets = dict(data["offsets"])
+            except (ValueError, KeyError) as e:
+                # Rebuild everything from the partitions still on disk
+                log.error(f"Invalid {ROLLUPS}, rebuilding from the event log", exc_info=e)
+                self.rollups, self.offsets = {}, {}
+        self.checkpointed = dict(self.offsets)
+        replayed = 0
+        for partition in sorted(self.directory.glob("events-*.jsonl")):
+            with partition.open("rb") as fs:
+                fs.seek(self.offsets.get(partition.name, 0))
+                for line in fs:
+                    try:
+                        row = json.loads(line)
+                        self._fold(row["t"], row["g"], row["u"], row["e"], row["n"])
+                    except (ValueError, KeyError) as e:
+                        # Most likely a torn write at the end of the partition
+                        log.warning(f"Skipping bad event row {line!r}", exc_info=e)
+                        continue
+                    replayed += 1
+                self.offsets[partition.name] = fs.tell()
+        if replayed:
+            self._changed = True
+            log.info(f"Replayed {replayed} event rows into the rollups")
+
+    def prepare(self) -> Callable[[], int] | None:
+        """Take the queued rows on the event loop, the returned writer appends them off it"""
+        if not self._pending:
+            return None
+        partitions = self._take_rows()
+        return lambda: self._append(partitions)
+
+    def checkpoint(self) -> Callable[[], int] | None:
+        """Capture the queued rows and the rollups together, the returned writer persists both off the loop.
+
+        Both are taken in the same loop turn, so every row the rollups include is appended before the
+        offsets are written, and every row recorded afterwards lands past them.
+        """
+        if not self._changed and not self._pending:
+            return None
+        self._changed = False
+        partitions = self._take_rows()
+        rollups = self._copy_rollups()
+
+        def write() -> int:
+            try:
+                written = self._append(partitions)
+                # Offsets are only ever read and written in writer threads, which the save lock serializes
+                offsets = dict(self.offsets)
+                data = json.dumps({"rollups": rollups, "offsets": offsets}, separators=(",", ":"))
+                written += write_atomic(self.directory / ROLLUPS, data)
+            except Exception:
+                self._changed = True
+                raise
+            self.checkpointed = offsets
+            return written
+
+        return write
+
+    def _take_rows(self) -> dict[str, list[dict[str, Any]]]:
+        rows, self._pending = self._pending, []
+        partitions: dict[str, list[dict[str, Any]]] = {}
+        for row in rows:
+            partitions.setdefault(partition_name(row["t"]), []).append(row)
+        return partitions
+
+    def _copy_rollups(self) -> dict[int, dict[int, dict[int, dict[str, int]]]]:
+        """Copy of the rollups a writer thread can serialize.
+
+        Events are only ever folded into the current day, so older days are shared as they are and only
+        the last two (in case the day turns meanwhile) are copied in full.
+        """
+        recent = int(time.time() // DAY) - 1
+        return {
+            gid: {
+                day: {uid: dict(counts) for uid, counts in users.items()} if day >= recent else users
+                for day, users in days.items()
+            }
+            for gid, days in self.rollups.items()
+        }
+
+    def _append(self, partitions: dict[str, list[dict[str, Any]]]) -> int:
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            written = 0
+            for name in list(partitions):
+                data = "".join(json.dumps(row, separators=(",", ":")) + "\n" for row in partitions[name])
+                data = data.encode("utf-8")
+                with (self.directory / name).open("ab") as fs:
+                    fs.write(data)
+                    fs.flush()
+                    os.fsync(fs.fileno())
+                    self.offsets[name] = fs.tell()
+                del partitions[name]
+                written += len(data)
+            return written
+        except Exception:
+            # Rows of partitions already appended to must not be written twice
+            self._pending[:0] = [row for rows in partitions.values() for row in rows]
+            raise
+
+    def expire_rollups(self, now: float | None = None) -> int:
+        """Drop rollup days past `rollup_retention_days`, returns how many guild days were dropped"""
+        oldest = int((now or time.time()) // DAY) - self.rollup_retention_days
+        dropped = 0
+        for gid, days in list(self.rollups.items()):
+            for day in [day for day in days if day < oldest]:
+                del days[day]
+                dropped += 1
+            if not days:
+                del self.rollups[gid]
+        if dropped:
+            self._changed = True
+        return dropped
+
+    def compact(self, now: float | None = None) -> list[str]:
+        """Delete partitions older than `raw_retention_days` that the last checkpoint fully includes"""
+        cutoff = partition_name((now or time.time()) - self.raw_retention_days * DAY)
+        removed = []
+        for partition in sorted(self.directory.glob("events-*.jsonl")):
+            # Names sort chronologically, the cutoff month itself is kept
+            if partition.name >= cutoff:
+                break
+            if self.checkpointed.get(partition.name) != partition.stat().st_size:
+                continue
+            partition.unlink()
+            self.offsets.pop(partition.name, None)
+            self.checkpointed.pop(partition.name, None)
+            removed.append(partition.name)
+        return removed
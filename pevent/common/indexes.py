@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from typing import Any, Callable
+
+from .models import DB, User
+
+# Ranking name -> (fields it depends on, score of a user). Every event counter ranks by its own value
+METRICS: dict[str, tuple[frozenset[str], Callable[[User], float]]] = {
+    name: (frozenset({name}), lambda user, name=name: getattr(user, name))
+    for name in User.model_fields
+    if name.startswith("user_total_")
+}
+METRICS["completion_rate"] = (
+    frozenset({"user_total_setup", "user_total_complete"}),
+    lambda user: user.user_total_complete / user.user_total_setup if user.user_total_setup else 0,
+)
+
+FLAGS = tuple(name for name, field in User.model_fields.items() if field.annotation is bool)
+
+
+class Ranking:
+    """Users ordered by one score, highest first, ties broken by user id. Users scoring 0 are left out.
+
+    Entries are kept sorted as (-score, user id) so a user is found by bisection and a page is a slice.
+    """
+
+    def __init__(self, scores: dict[int, float] | None = None):
+        self.scores = {uid: score for uid, score in (scores or {}).items() if score}
+        self.entries = sorted((-score, uid) for uid, score in self.scores.items())
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def update(self, uid: int, score: float) -> None:
+        old = self.scores.pop(uid, None)
+        if old == score:
+            self.scores[uid] = old
+            return
+        if old is not None:
+            del self.entries[bisect_left(self.entries, (-old, uid))]
+        if score:
+            insort(self.entries, (-score, uid))
+            self.scores[uid] = score
+
+    def page(self, start: int, count: int) -> list[tuple[int, float]]:
+        """(user id, score) for ranks `start` to `start + count`, zero based"""
+        return [(uid, -score) for score, uid in self.entries[start : start + count]]
+
+    def rank(self, uid: int) -> int | None:
+        """One based rank of a user, None if they are not on the board"""
+        score = self.scores.get(uid)
+        if score is None:
+            return None
+        return bisect_left(self.entries, (-score, uid)) + 1
+
+
+class GuildIndex:
+    """Base for per-guild indexes kept current by a DB listener.
+
+    A guild is indexed with one scan the first time it is asked for, after that every field change
+    updates it in place.
+    """
+
+    def __init__(self):
+        self.db: DB | None = None
+        self._guilds: dict[int, Any] = {}
+
+    def attach(self, db: DB) -> None:
+        """Follow `db`, anything indexed for a previous DB is dropped"""
+        self.detach()
+        self.db = db
+        db.add_listener(self._on_change)
+
+    def detach(self) -> None:
+        if self.db is not None:
+            self.db.remove_listener(self._on_change)
+            self.db = None
+        self._guilds.clear()
+
+    def _on_change(self, gid: int | None, uid: int | None, field: str, old: Any, new: Any) -> None:
+        raise NotImplementedError
+
+
+class Rankings(GuildIndex):
+    """Per-guild leaderboards, one `Ranking` per metric that has been asked for"""
+
+    def board(self, gid: int, metric: str) -> Ranking:
+        boards = self._guilds.setdefault(gid, {})
+        ranking = boards.get(metric)
+        if ranking is None:
+            score = METRICS[metric][1]
+            users = self.db.get_conf(gid).users
+            ranking = boards[metric] = Ranking({uid: score(user) for uid, user in users.items()})
+        return ranking
+
+    def _on_change(self, gid: int | None, uid: int | None, field: str, old: Any, new: Any) -> None:
+        boards = self._guilds.get(gid)
+        if not boards:
+            return
+        user = None
+        for metric, ranking in boards.items():
+            fields, score = METRICS[metric]
+            if field not in fields:
+                continue
+            if user is None:
+                user = self.db.get_conf(gid).peek_user(uid)
+            ranking.update(uid, score(user))
+
+
+class FlagSets(GuildIndex):
+    """Per-guild sets of the users that have each status flag set"""
+
+    def members(self, gid: int, flag: str) -> set[int]:
+        sets = self._guilds.get(gid)
+        if sets is None:
+            sets = self._guilds[gid] = {name: set() for name in FLAGS}
+            for uid, user in self.db.get_conf(gid).users.items():
+                for name in FLAGS:
+                    if getattr(user, name):
+                        sets[name].add(uid)
+        return sets[flag]
+
+    def _on_change(self, gid: int | None, uid: int | None, field: str, old: Any, new: Any) -> None:
+        sets = self._guilds.get(gid)
+        if sets is None or field not in sets:
+            return
+        if new:
+            sets[field].add(uid)
+        else:
+            sets[field].discard(uid)
@@ -1,6 +1,26 @@
+import asyncio
+import json
+import logging
+from array import array
+from collections.abc import MutableMapping
+from dataclasses import dataclass, fields
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Generator, Iterable, Iterator
+
 import discord
+from pydantic import ConfigDict, Field, GetCoreSchemaHandler, PrivateAttr
+from pydantic_core import core_schema, to_json
+from pydantic_core.core_schema import SerializationInfo
+
+from . import Base, paused_gc
+from .perf import PERF
+from .snapshot import GLOBAL_SHARD, INDEX_SUFFIX, Snapshot, UserDumps, checksum
 
-from . import Base
+log = logging.getLogger("red.pevent.models")
+
+# Called with (guild_id, user_id, field, old, new), both ids are None for global settings like deposit_value
+Listener = Callable[[int | None, int | None, str, Any, Any], None]
 
 
 class User(Base):
@@ -14,19 +34,658 @@ class User(Base):
     can_make_deposit: bool = False
     has_active_deposit: bool = False
     is_banned_from_host: bool = False
-    
+    # Unix time of the last `pdeposit`, 0 if it predates tracking
+    last_deposit_at: int = 0
+
+    # Bound by GuildSettings.get_user so field changes reach the DB listeners
+    _on_change: Callable[[str, Any, Any], None] | None = PrivateAttr(default=None)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if self._on_change is None or name not in USER_FIELDS:
+            return super().__setattr__(name, value)
+        old = getattr(self, name)
+        super().__setattr__(name, value)
+        if old != value:
+            self._on_change(name, old, value)
+
+
+    def is_default(self) -> bool:
+        return not self.model_dump()
+
+
+class ReadOnlyUser(User):
+    model_config = ConfigDict(frozen=True)
+
+
+USER_FIELDS = frozenset(User.model_fields)
+USER_DEFAULTS = {name: field.default for name, field in User.model_fields.items()}
+# Handed out by `peek_user` for users that have no record
+DEFAULT_USER = ReadOnlyUser()
+
+
+# The table keeps ints as signed 64-bit columns and bools as bits, all of them default to 0
+COUNTERS = tuple(name for name, field in User.model_fields.items() if field.annotation is int)
+FLAGS = tuple(name for name, field in User.model_fields.items() if field.annotation is bool)
+COUNTER_INDEX = {name: i for i, name in enumerate(COUNTERS)}
+FLAG_BITS = {name: 1 << i for i, name in enumerate(FLAGS)}
+# (field, counter column or None, flag bit) in model order, so table dumps match `json_serializer(User)`
+ROW_LAYOUT = tuple((name, COUNTER_INDEX.get(name), FLAG_BITS.get(name, 0)) for name in User.model_fields)
+
+
+def _row_fields(counters: list[array], flags: bytearray, row: int) -> dict[str, Any]:
+    """The non-default fields of a row"""
+    bits = flags[row]
+    fields = {}
+    for name, column, bit in ROW_LAYOUT:
+        if column is None:
+            if bits & bit:
+                fields[name] = True
+        elif value := counters[column][row]:
+            fields[name] = value
+    return fields
+
+
+class UserView:
+    """`User`-compatible view of one row of a `UserTable`, what `GuildSettings` hands out.
+
+    Reads and writes go straight to the table's columns and changes are reported the way a bound `User`
+    reports them. A view of a user compacted away reads the defaults and puts the user back on its first change.
+    """
+
+    __slots__ = ("_table", "_uid", "_on_change")
+
+    def __init__(self, table: "UserTable", uid: int, on_change: Callable[[str, Any, Any], None] | None = None):
+        self._table = table
+        self._uid = uid
+        self._on_change = on_change
+
+    def __repr__(self) -> str:
+        fields = " ".join(f"{k}={v!r}" for k, v in self.model_dump(exclude_defaults=False).items())
+        return f"UserView({fields})"
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (UserView, User)):
+            return self.model_dump() == other.model_dump()
+        return NotImplemented
+
+    __hash__ = None
+
+    def _set(self, name: str, value: Any) -> None:
+        old = self._table.get_field(self._uid, name)
+        if old == value:
+            return
+        self._table.set_field(self._uid, name, value)
+        if self._on_change is not None:
+            self._on_change(name, old, value)
+
+    def model_dump(self, *, exclude_defaults: bool = True, **_) -> dict[str, Any]:
+        fields = self._table.get_fields(self._uid)
+        if exclude_defaults:
+            return fields
+        return {**USER_DEFAULTS, **fields}
+
+    def is_default(self) -> bool:
+        return not self.model_dump()
+
+    def to_user(self) -> User:
+        return User.construct_trusted(self.model_dump())
+
+
+def _field_property(name: str) -> property:
+    return property(
+        lambda self: self._table.get_field(self._uid, name),
+        lambda self, value: self._set(name, value),
+    )
+
+
+for _name in User.model_fields:
+    setattr(UserView, _name, _field_property(_name))
+
+
+class UserTable(MutableMapping):
+    """Column store behind `GuildSettings.users`, mapping user id -> `UserView`.
+
+    One signed 64-bit array per int field, a byte per user holding the bool fields as a bitfield, and
+    a dict mapping user id to row. Removing a user moves the last row into its slot. Validates from and
+    serializes to the same `{user id: User}` JSON a dict of models did.
+    """
+
+    def __init__(self):
+        self.index: dict[int, int] = {}
+        self.ids = array("q")
+        self.counters = [array("q") for _ in COUNTERS]
+        self.flags = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.index)
+
+    def __contains__(self, uid: object) -> bool:
+        return uid in self.index
+
+    def __getitem__(self, uid: int) -> UserView:
+        if uid not in self.index:
+            raise KeyError(uid)
+        return UserView(self, uid)
+
+    def __setitem__(self, uid: int, user: User | UserView) -> None:
+        values = [getattr(user, name) for name in COUNTERS]
+        for name, value in zip(COUNTERS, values):
+            self._check(name, value)
+        row = self.add(uid)
+        for column, value in zip(self.counters, values):
+            column[row] = value
+        self.flags[row] = sum(bit for name, bit in FLAG_BITS.items() if getattr(user, name))
+
+    def __delitem__(self, uid: int) -> None:
+        row = self.index.pop(uid)
+        last = len(self.ids) - 1
+        if row != last:
+            moved = self.ids[last]
+            self.ids[row] = moved
+            for column in self.counters:
+                column[row] = column[last]
+            self.flags[row] = self.flags[last]
+            self.index[moved] = row
+        self.ids.pop()
+        for column in self.counters:
+            column.pop()
+        self.flags.pop()
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, UserTable):
+            return len(self) == len(other) and all(self.get_fields(uid) == other.get_fields(uid) for uid in self)
+        return super().__eq__(other)
+
+    def __copy__(self) -> "UserTable":
+        table = UserTable.__new__(UserTable)
+        table.index = self.index.copy()
+        table.ids = self.ids[:]
+        table.counters = [column[:] for column in self.counters]
+        table.flags = self.flags[:]
+        return table
+
+    def add(self, uid: int) -> int:
+        """Row of `uid`, appending a default row if it has none"""
+        row = self.index.get(uid)
+        if row is None:
+            row = len(self.ids)
+            self.ids.append(uid)
+            for column in self.counters:
+                column.append(0)
+            self.flags.append(0)
+            self.index[uid] = row
+        return row
+
+    def get_field(self, uid: int, name: str) -> int | bool:
+        row = self.index.get(uid)
+        if row is None:
+            return USER_DEFAULTS[name]
+        if name in FLAG_BITS:
+            return bool(self.flags[row] & FLAG_BITS[name])
+        return self.counters[COUNTER_INDEX[name]][row]
+
+    def get_fields(self, uid: int) -> dict[str, Any]:
+        """The non-default fields of `uid`, empty if it has no row"""
+        row = self.index.get(uid)
+        if row is None:
+            return {}
+        return _row_fields(self.counters, self.flags, row)
+
+    def set_field(self, uid: int, name: str, value: int | bool) -> None:
+        if name in FLAG_BITS:
+            row = self.add(uid)
+            if value:
+                self.flags[row] |= FLAG_BITS[name]
+            else:
+                self.flags[row] &= ~FLAG_BITS[name] & 0xFF
+        elif name in COUNTER_INDEX:
+            self._check(name, value)
+            self.counters[COUNTER_INDEX[name]][self.add(uid)] = value
+        else:
+            raise AttributeError(name)
+
+    @staticmethod
+    def _check(name: str, value: Any) -> None:
+        if not isinstance(value, int):
+            raise TypeError(f"{name} must be an int, not {type(value).__name__}")
+        if not -(2**63) <= value < 2**63:
+            raise ValueError(f"{name}={value} does not fit in 64 bits")
+
+    def flagged(self, name: str) -> list[int]:
+        """Ids of the users whose bool field `name` is set"""
+        bit = FLAG_BITS[name]
+        return [self.ids[row] for row, bits in enumerate(self.flags) if bits & bit]
+
+    def default_ids(self) -> list[int]:
+        """Ids of the users whose fields are all default"""
+        used = bytearray(self.flags)
+        for column in self.counters:
+            for row, value in enumerate(column):
+                if value:
+                    used[row] = 1
+        return [self.ids[row] for row, bits in enumerate(used) if not bits]
+
+    def dump(self, uid: int) -> bytes:
+        """The JSON `json_serializer(User)` gives for `uid`"""
+        return to_json(self.get_fields(uid))
+
+    def dumper(self) -> Callable[[], dict[int, bytes]]:
+        """Copy the columns and return a function serializing every user from the copy.
+
+        Copying is a few buffer copies, so it fits the event loop, and the function is safe to run in
+        another thread while the table keeps changing.
+        """
+        ids, counters, flags = self.ids[:], [column[:] for column in self.counters], self.flags[:]
+        return lambda: {uid: to_json(_row_fields(counters, flags, row)) for row, uid in enumerate(ids)}
+
+    @classmethod
+    def from_fields(cls, users: Iterable[tuple[int, dict[str, Any]]]) -> "UserTable":
+        """Build from (user id, non-default fields) pairs this cog wrote itself, without validating them"""
+        table = cls()
+        counters, flags = table.counters, table.flags
+        for uid, fields in users:
+            row = table.add(uid)
+            for name, value in fields.items():
+                if name in FLAG_BITS:
+                    if value:
+                        flags[row] |= FLAG_BITS[name]
+                else:
+                    counters[COUNTER_INDEX[name]][row] = value
+        return table
+
+    @classmethod
+    def from_users(cls, users: dict[int, User]) -> "UserTable":
+        table = cls()
+        for uid, user in users.items():
+            table[uid] = user
+        return table
+
+    def _serialize(self, info: SerializationInfo) -> dict[int, dict[str, Any]]:
+        return {uid: self[uid].model_dump(exclude_defaults=info.exclude_defaults) for uid in self}
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source: Any, handler: GetCoreSchemaHandler) -> core_schema.CoreSchema:
+        from_dict = core_schema.no_info_after_validator_function(cls.from_users, handler(dict[int, User]))
+        return core_schema.union_schema(
+            [core_schema.is_instance_schema(cls), from_dict],
+            serialization=core_schema.plain_serializer_function_ser_schema(cls._serialize, info_arg=True),
+        )
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the columns, excluding the id index"""
+        arrays = [self.ids, *self.counters]
+        return sum(a.buffer_info()[1] * a.itemsize for a in arrays) + len(self.flags)
+
+
+# User counters summed into GuildStats, and the total each one is summed into
+STAT_FIELDS = {
+    "user_total_setup": "setups",
+    "user_total_complete": "completions",
+    "user_total_success": "successes",
+    "user_total_cancelled": "cancellations",
+}
+
+
+@dataclass
+class GuildStats:
+    """Guild-wide totals, adjusted by each user field change instead of summed over every user"""
+
+    setups: int = 0
+    completions: int = 0
+    successes: int = 0
+    cancellations: int = 0
+    active_deposits: int = 0
+
+    @classmethod
+    def from_users(cls, users: Iterable[User]) -> "GuildStats":
+        stats = cls()
+        for user in users:
+            for field in (*STAT_FIELDS, "has_active_deposit"):
+                if value := getattr(user, field):
+                    stats.apply(field, 0, value)
+        return stats
+
+    def apply(self, field: str, old: Any, new: Any) -> None:
+        total = STAT_FIELDS.get(field)
+        if total is not None:
+            setattr(self, total, getattr(self, total) + new - old)
+        elif field == "has_active_deposit":
+            self.active_deposits += 1 if new else -1
+
+    @property
+    def success_rate(self) -> float:
+        """Share of completed events that were successful"""
+        return self.successes / self.completions if self.completions else 0.0
+
+    def drift(self, actual: "GuildStats") -> dict[str, tuple[int, int]]:
+        """{total: (kept, actual)} for every total that differs from `actual`"""
+        return {
+            f.name: (getattr(self, f.name), getattr(actual, f.name))
+            for f in fields(self)
+            if getattr(self, f.name) != getattr(actual, f.name)
+        }
+
+
 class GuildSettings(Base):
-    users: dict[int, User] = {}
+    users: UserTable = Field(default_factory=UserTable)
+
+    _on_change: Callable[[int, str, Any, Any], None] | None = PrivateAttr(default=None)
+    # Built by the first `stats` access and kept current by `_user_changed` from then on
+    _stats: GuildStats | None = PrivateAttr(default=None)
+
+    @property
+    def stats(self) -> GuildStats:
+        if self._stats is None:
+            self._stats = GuildStats.from_users(self.users.values())
+        return self._stats
+
+    def verify_stats(self) -> dict[str, tuple[int, int]]:
+        """Recount `stats` from every user, returns the totals that had drifted as (kept, actual)"""
+        actual = GuildStats.from_users(self.users.values())
+        drift = self.stats.drift(actual)
+        self._stats = actual
+        return drift
 
-    def get_user(self, user: discord.User | int) -> User:
+    def get_user(self, user: discord.User | int) -> UserView:
         uid = user if isinstance(user, int) else user.id
-        return self.users.setdefault(uid, User())
+        self.users.add(uid)
+        return self._bind(uid)
+
+    def peek_user(self, user: discord.User | int) -> UserView | User:
+        """Like `get_user` for read-only commands, unknown users get a shared default instead of a new record"""
+        uid = user if isinstance(user, int) else user.id
+        if uid not in self.users:
+            return DEFAULT_USER
+        return self._bind(uid)
+
+    def _bind(self, uid: int) -> UserView:
+        on_change = None if self._on_change is None else partial(self._user_changed, uid)
+        return UserView(self.users, uid, on_change)
+
+    def _user_changed(self, uid: int, field: str, old: Any, new: Any) -> None:
+        if self._stats is not None:
+            self._stats.apply(field, old, new)
+        self._on_change(uid, field, old, new)
+
+    @classmethod
+    def from_trusted_json(cls, raw: bytes) -> "GuildSettings":
+        """Build from JSON this cog wrote itself without validating it"""
+        users = json.loads(raw).get("users", {})
+        table = UserTable.from_fields((int(uid), fields) for uid, fields in users.items())
+        return cls.construct_trusted({"users": table})
+
+    def compact(self) -> list[int]:
+        """Drop users whose stats are all default, returns their ids"""
+        empty = self.users.default_ids()
+        for uid in empty:
+            del self.users[uid]
+        return empty
 
 
 class DB(Base):
     configs: dict[int, GuildSettings] = {}
     deposit_value: int = 2500
+    save_delay: float = 2.0
+    # Hours a deposit may stay active before `deposit_expiry_action` is taken, 0 never expires
+    deposit_expiry_hours: float = 0
+    # "notify" reminds the server owner every `deposit_expiry_hours`, "cancel" cancels the event without notice
+    deposit_expiry_action: str = "notify"
+
+    _listeners: list[Listener] = PrivateAttr(default_factory=list)
+    _dirty: set[int] = PrivateAttr(default_factory=set)
+    _dirty_global: bool = PrivateAttr(default=False)
+    # Guilds not validated yet, either their raw JSON or their shard file
+    _pending: dict[int, bytes | Path] = PrivateAttr(default_factory=dict)
+    # Serialized users per loaded guild for snapshots, and the users changed since they were serialized
+    _dumps: dict[int, dict[int, bytes] | UserDumps] = PrivateAttr(default_factory=dict)
+    _stale: dict[int, set[int]] = PrivateAttr(default_factory=dict)
+    # Pending raw guilds came from a file whose checksum matched, so they skip validation
+    _trusted: bool = PrivateAttr(default=False)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name not in DB_FIELDS or name == "configs":
+            return super().__setattr__(name, value)
+        old = getattr(self, name)
+        super().__setattr__(name, value)
+        if old != value:
+            self._notify(None, None, name, old, value)
 
     def get_conf(self, guild: discord.Guild | int) -> GuildSettings:
         gid = guild if isinstance(guild, int) else guild.id
-        return self.configs.setdefault(gid, GuildSettings())
+        conf = self.configs.get(gid)
+        if conf is None:
+            conf = self.configs.setdefault(gid, self._load_pending(gid))
+        if conf._on_change is None:
+            conf._on_change = partial(self._notify, gid)
+        return conf
+
+    def _load_pending(self, gid: int) -> GuildSettings:
+        raw = self._pending.get(gid)
+        if raw is None:
+            return GuildSettings()
+        with paused_gc():
+            if isinstance(raw, Path):
+                conf = GuildSettings.from_file(raw)
+            elif self._trusted:
+                conf = GuildSettings.from_trusted_json(raw)
+            else:
+                conf = GuildSettings.model_validate_json(raw)
+        del self._pending[gid]
+        return conf
+
+    @property
+    def pending(self) -> int:
+        """Number of guilds that have not been loaded yet"""
+        return len(self._pending)
+
+    def load_all(self) -> None:
+        """Validate every guild that is still pending"""
+        with paused_gc():
+            for gid in list(self._pending):
+                self.get_conf(gid)
+
+    def active_deposits(self, pending: bool = True) -> Iterator[tuple[int, int, int]]:
+        """Yield (guild id, user id, last_deposit_at) for every active deposit.
+
+        Guilds that are still pending are scanned straight from their JSON without being loaded,
+        unless `pending` is False.
+        """
+        for gid, conf in self.configs.items():
+            for uid in conf.users.flagged("has_active_deposit"):
+                yield gid, uid, conf.users.get_field(uid, "last_deposit_at")
+        if pending:
+            yield from self.scan_pending(self.pending_items())
+
+    def pending_items(self) -> list[tuple[int, bytes | Path]]:
+        """The guilds still pending with their raw JSON or shard file, safe to hand to another thread"""
+        return [(gid, raw) for gid, raw in self._pending.items() if gid not in self.configs]
+
+    @staticmethod
+    def scan_pending(items: Iterable[tuple[int, bytes | Path]]) -> Iterator[tuple[int, int, int]]:
+        """Yield the active deposits of pending guilds, a guild that cannot be read is logged and skipped"""
+        for gid, raw in items:
+            try:
+                data = json.loads(raw.read_bytes() if isinstance(raw, Path) else raw)
+                deposits = [
+                    (gid, int(uid), fields.get("last_deposit_at", 0))
+                    for uid, fields in data.get("users", {}).items()
+                    if fields.get("has_active_deposit")
+                ]
+            except (OSError, ValueError, AttributeError) as e:
+                # Loading the guild reports the same problem to whoever touches it
+                log.error(f"Could not scan guild {gid} for active deposits", exc_info=e)
+                continue
+            yield from deposits
+
+    def compact_users(self) -> int:
+        """Drop default users from every loaded guild, guilds still pending are compacted once loaded"""
+        removed = 0
+        for gid, conf in list(self.configs.items()):
+            uids = conf.compact()
+            if uids:
+                self._dirty.add(gid)
+                self._stale.setdefault(gid, set()).update(uids)
+                removed += len(uids)
+        return removed
+
+    def add_listener(self, listener: Listener) -> None:
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Listener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, gid: int | None, uid: int | None, field: str, old: Any, new: Any) -> None:
+        if gid is None:
+            self._dirty_global = True
+        else:
+            self._dirty.add(gid)
+            self._stale.setdefault(gid, set()).add(uid)
+        for listener in self._listeners:
+            listener(gid, uid, field, old, new)
+
+    def apply(self, gid: int | None, uid: int | None, field: str, value: Any) -> None:
+        """Set a single field, as recorded by a listener"""
+        if gid is None:
+            setattr(self, field, value)
+        else:
+            setattr(self.get_conf(gid).get_user(uid), field, value)
+
+    def take_dirty(self) -> tuple[set[int], bool]:
+        """Return and reset the guilds (and whether the global settings) changed since the last call"""
+        dirty, self._dirty = self._dirty, set()
+        dirty_global, self._dirty_global = self._dirty_global, False
+        return dirty, dirty_global
+
+    def mark_dirty(self, guild_ids: Iterable[int] = (), dirty_global: bool = False) -> None:
+        self._dirty.update(guild_ids)
+        self._dirty_global = self._dirty_global or dirty_global
+
+    @classmethod
+    def from_file(cls, path: Path, shard_dir: Path | None = None, lazy: bool = False) -> "DB":
+        """Load the DB from `path`, or from `shard_dir` if given.
+
+        If `shard_dir` has no shards yet, the monolithic file at `path` is split into it and renamed to `.bak`.
+        With `lazy`, guilds are only indexed and each one is validated by its first `get_conf`.
+        """
+        if shard_dir is None:
+            if lazy and (db := cls._from_index(path)) is not None:
+                return db
+            return super().from_file(path)
+        if (shard_dir / GLOBAL_SHARD).exists():
+            return cls.from_shards(shard_dir, lazy=lazy)
+        db = super().from_file(path)
+        db.to_shards(shard_dir)
+        path.replace(path.with_name(f"{path.name}.bak"))
+        return db
+
+    @classmethod
+    def _from_index(cls, path: Path) -> "DB | None":
+        """Index a file written by `to_file` using its sidecar, None if the sidecar is missing or stale"""
+        index_path = path.with_name(path.name + INDEX_SUFFIX)
+        try:
+            index = json.loads(index_path.read_bytes())
+            stat = path.stat()
+        except (FileNotFoundError, ValueError):
+            return None
+        if index.get("size") != stat.st_size or index.get("mtime") != stat.st_mtime_ns:
+            return None
+        data = path.read_bytes()
+        db = cls.model_validate(index["settings"])
+        db._pending = {int(gid): data[start:end] for gid, (start, end) in index["guilds"].items()}
+        db._trusted = index.get("checksum") == checksum(data)
+        return db
+
+    @classmethod
+    def from_shards(cls, directory: Path, lazy: bool = False) -> "DB":
+        db = cls.from_file(directory / GLOBAL_SHARD)
+        for shard in directory.glob("*.json"):
+            if shard.name == GLOBAL_SHARD:
+                continue
+            if lazy:
+                db._pending[int(shard.stem)] = shard
+            else:
+                db.configs[int(shard.stem)] = GuildSettings.from_file(shard)
+        return db
+
+    def _capture(self, guild_ids: Iterable[int] | None) -> Generator[None, None, Snapshot]:
+        """Build a snapshot on the event loop, yielding after each guild that has to be serialized in full.
+
+        Only users changed since the last snapshot are serialized again. Their guild gets a new dict of
+        dumps so snapshots already handed to a writer thread never change underneath it. A guild with no
+        dumps yet has its user columns copied, all in the same loop turn so the copy is a point-in-time
+        view, and handed over as `UserDumps` for the writer to serialize.
+        """
+        if guild_ids is None:
+            guild_ids = [*self.configs, *(gid for gid in self._pending if gid not in self.configs)]
+        guilds = {}
+        for gid in guild_ids:
+            conf = self.configs.get(gid)
+            if conf is None:
+                if (raw := self._pending.get(gid)) is not None:
+                    guilds[gid] = raw
+                continue
+            stale = self._stale.pop(gid, None)
+            dumps = self._dumps.get(gid)
+            if isinstance(dumps, UserDumps):
+                # None if no writer got to it yet, copying the users again is cheaper than dumping them here
+                dumps = dumps.dumps
+            if dumps is None:
+                # Copying the columns is far cheaper than dumping them
+                self._dumps[gid] = guilds[gid] = UserDumps(conf.users.dumper())
+                yield
+                continue
+            if stale:
+                dumps = dict(dumps)
+                for uid in stale:
+                    if uid in conf.users:
+                        dumps[uid] = conf.users.dump(uid)
+                    else:
+                        dumps.pop(uid, None)
+                self._dumps[gid] = dumps
+            guilds[gid] = dumps
+        settings = self.model_dump(mode="json", exclude={"configs"}, exclude_defaults=False)
+        return Snapshot(settings=settings, guilds=guilds)
+
+    def snapshot(self, guild_ids: Iterable[int] | None = None) -> Snapshot:
+        """Capture every guild, or only `guild_ids`, in one go"""
+        steps = self._capture(guild_ids)
+        while True:
+            try:
+                next(steps)
+            except StopIteration as done:
+                return done.value
+
+    async def snapshot_async(self, guild_ids: Iterable[int] | None = None) -> Snapshot:
+        """Like `snapshot` but gives the event loop a turn after each guild serialized in full"""
+        steps = self._capture(guild_ids)
+        while True:
+            try:
+                next(steps)
+            except StopIteration as done:
+                return done.value
+            await asyncio.sleep(0)
+
+    def to_file(self, path: Path) -> int:
+        return self.snapshot().to_file(path)
+
+    def to_shards(
+        self,
+        directory: Path,
+        guild_ids: Iterable[int] | None = None,
+        write_global: bool = True,
+    ) -> int:
+        """Write each guild to its own shard file, or only `guild_ids` if given. Returns the bytes written"""
+        if guild_ids is not None:
+            guild_ids = list(guild_ids)
+        return self.snapshot(guild_ids).to_shards(directory, guild_ids, write_global)
+
+
+DB_FIELDS = frozenset(DB.model_fields)
+
+PERF.instrument(DB, "get_conf", "db.get_conf")
+PERF.instrument(GuildSettings, "get_user", "db.get_user")
+PERF.instrument(GuildSettings, "peek_user", "db.peek_user")
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, ContextManager, Iterator
+
+# Times are recorded in microseconds so every histogram shares the same integer bucketing
+MICROSECONDS = 1_000_000
+
+
+class Histogram:
+    """Power-of-two bucketed histogram, cheap enough to update on every call"""
+
+    __slots__ = ("unit", "count", "total", "min", "max", "buckets")
+
+    def __init__(self, unit: str):
+        self.unit = unit
+        self.count = 0
+        self.total = 0
+        self.min: int | None = None
+        self.max = 0
+        # Upper bound (a power of two) -> number of samples at or below it and above the previous bound
+        self.buckets: dict[int, int] = {}
+
+    def add(self, value: int) -> None:
+        value = max(0, int(value))
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = max(self.max, value)
+        bound = 1 << max(0, value - 1).bit_length()
+        self.buckets[bound] = self.buckets.get(bound, 0) + 1
+
+    def percentile(self, q: float) -> int:
+        """Upper bound of the bucket holding the `q` quantile, capped at the largest sample"""
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for bound in sorted(self.buckets):
+            seen += self.buckets[bound]
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "unit": self.unit,
+            "count": self.count,
+            "total": self.total,
+            "min": self.min or 0,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "buckets": {str(bound): n for bound, n in sorted(self.buckets.items())},
+        }
+
+
+class Perf:
+    """Opt-in hot path instrumentation.
+
+    While disabled, `timer` hands out a shared no-op context manager and the methods registered with
+    `instrument` are left untouched, so the only cost is an attribute check. Enabling swaps those
+    methods for timed wrappers, disabling puts the originals back.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.since = time.time()
+        self.histograms: dict[str, Histogram] = {}
+        self.counters: dict[str, int] = {}
+        # Samples come from the event loop and from the threads writing files
+        self._lock = threading.Lock()
+        self._targets: list[tuple[type, str, str]] = []
+        self._originals: dict[tuple[type, str], Any] = {}
+        self._noop = nullcontext()
+
+    def enable(self) -> None:
+        if self.enabled:
+            return
+        self.enabled = True
+        for owner, attr, metric in self._targets:
+            self._wrap(owner, attr, metric)
+
+    def disable(self) -> None:
+        if not self.enabled:
+            return
+        self.enabled = False
+        for (owner, attr), original in self._originals.items():
+            setattr(owner, attr, original)
+        self._originals.clear()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.since = time.time()
+
+    def instrument(self, owner: type, attr: str, metric: str) -> None:
+        """Time every call to `owner.attr` under `metric` while enabled"""
+        self._targets.append((owner, attr, metric))
+        if self.enabled:
+            self._wrap(owner, attr, metric)
+
+    def _wrap(self, owner: type, attr: str, metric: str) -> None:
+        original = owner.__dict__[attr]
+        self._originals[(owner, attr)] = original
+        observe = self.observe
+
+        if inspect.iscoroutinefunction(original):
+
+            @functools.wraps(original)
+            async def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await original(*args, **kwargs)
+                finally:
+                    observe(metric, time.perf_counter() - start)
+
+        else:
+
+            @functools.wraps(original)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    observe(metric, time.perf_counter() - start)
+
+        setattr(owner, attr, timed)
+
+    def observe(self, metric: str, seconds: float) -> None:
+        """Record a duration"""
+        self.record(metric, seconds * MICROSECONDS, unit="us")
+
+    def record(self, metric: str, value: int | float, unit: str = "") -> None:
+        """Record a sample such as a size or a queue depth"""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(metric)
+            if histogram is None:
+                histogram = self.histograms[metric] = Histogram(unit)
+            histogram.add(value)
+
+    def count(self, metric: str, amount: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[metric] = self.counters.get(metric, 0) + amount
+
+    def timer(self, metric: str) -> ContextManager[None]:
+        """Time a block, works around awaits too"""
+        if not self.enabled:
+            return self._noop
+        return self._timer(metric)
+
+    @contextmanager
+    def _timer(self, metric: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(metric, time.perf_counter() - start)
+
+    def dump(self) -> dict[str, Any]:
+        """Everything recorded so far, as plain JSON-able data"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "since": self.since,
+                "now": time.time(),
+                "histograms": {name: h.to_dict() for name, h in sorted(self.histograms.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def report(self) -> str:
+        """Human readable table of the histograms and counters"""
+        lines = [f"{'metric':<32} {'count':>7} {'p50':>9} {'p95':>9} {'max':>9}"]
+        with self._lock:
+            for name, h in sorted(self.histograms.items()):
+                unit = h.unit
+                lines.append(
+                    f"{name:<32} {h.count:>7} "
+                    f"{_fmt(h.percentile(0.5), unit):>9} {_fmt(h.percentile(0.95), unit):>9} {_fmt(h.max, unit):>9}"
+                )
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"{name:<32} {value:>7}")
+        return "\n".join(lines)
+
+
+def _fmt(value: int, unit: str) -> str:
+    if unit == "us":
+        if value >= MICROSECONDS:
+            return f"{value / MICROSECONDS:.2f}s"
+        if value >= 1000:
+            return f"{value / 1000:.1f}ms"
+        return f"{value}us"
+    if unit == "B" and value >= 1024:
+        return f"{value / 1024:.1f}KiB"
+    return str(value)
+
+
+# Shared by the whole cog so the models and file writers can report without holding a reference to it
+PERF = Perf()
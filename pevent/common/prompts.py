@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+
+import discord
+
+
+class PromptDispatcher:
+    """Routes replies to pending confirmation prompts.
+
+    A prompt waits for the next message its author sends in its channel, like `bot.wait_for` with the
+    usual author/channel check. Incoming messages are matched with one dict lookup on (channel id,
+    author id) instead of running a check per pending prompt, and every timeout is handled by a
+    single timer task sleeping until the earliest deadline.
+    """
+
+    def __init__(self):
+        self._waiting: dict[tuple[int, int], list[asyncio.Future]] = {}
+        # (deadline, tie breaker, future), futures already resolved are dropped when they surface
+        self._deadlines: list[tuple[float, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._wake = asyncio.Event()
+        self._timer: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return sum(len(futures) for futures in self._waiting.values())
+
+    async def wait(self, channel_id: int, author_id: int, timeout: float) -> discord.Message:
+        """Wait for `author_id`'s next message in `channel_id`, raises `asyncio.TimeoutError` after `timeout` seconds"""
+        loop = asyncio.get_running_loop()
+        key = (channel_id, author_id)
+        future = loop.create_future()
+        self._waiting.setdefault(key, []).append(future)
+        heapq.heappush(self._deadlines, (loop.time() + timeout, next(self._counter), future))
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._expire())
+        else:
+            self._wake.set()
+        try:
+            return await future
+        finally:
+            self._discard(key, future)
+
+    def dispatch(self, message: discord.Message) -> None:
+        if not self._waiting:
+            return
+        futures = self._waiting.pop((message.channel.id, message.author.id), None)
+        for future in futures or ():
+            if not future.done():
+                future.set_result(message)
+
+    def _discard(self, key: tuple[int, int], future: asyncio.Future) -> None:
+        futures = self._waiting.get(key)
+        if futures and future in futures:
+            futures.remove(future)
+            if not futures:
+                del self._waiting[key]
+
+    async def _expire(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._deadlines:
+            now = loop.time()
+            while self._deadlines and self._deadlines[0][0] <= now:
+                _, _, future = heapq.heappop(self._deadlines)
+                if not future.done():
+                    future.set_exception(asyncio.TimeoutError())
+            if not self._deadlines:
+                break
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self._deadlines[0][0] - now)
+            except asyncio.TimeoutError:
+                pass
+
+    def close(self) -> None:
+        """Cancel every pending prompt and the timer"""
+        if self._timer is not None:
+            self._timer.cancel()
+        for futures in self._waiting.values():
+            for future in futures:
+                future.cancel()
+        self._waiting.clear()
+        self._deadlines.clear()
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import discord
+from redbot.core import commands
+from redbot.core.utils.chat_formatting import pagify
+
+
+class ReplyBuffer:
+    """Collects the status lines of a multi-step flow and sends them as one message.
+
+    Lines are held until the flow reaches a prompt (`ask`) or ends, so a flow costs one message per
+    prompt plus one for its outcome instead of one per line. Used as an async context manager, whatever
+    is still buffered is sent on exit, including when the flow raises.
+    """
+
+    def __init__(self, ctx: commands.Context):
+        self.ctx = ctx
+        self.lines: list[str] = []
+
+    async def __aenter__(self) -> ReplyBuffer:
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.flush()
+
+    def add(self, line: str) -> None:
+        self.lines.append(line)
+
+    def clear(self) -> None:
+        """Drop the buffered lines, for a flow whose outcome replaces them"""
+        self.lines.clear()
+
+    async def ask(self, prompt: str, embed: discord.Embed | None = None) -> None:
+        """Send the buffered lines followed by `prompt` in a single message"""
+        self.add(prompt)
+        await self.flush(embed=embed)
+
+    async def flush(self, embed: discord.Embed | None = None) -> None:
+        if not self.lines and embed is None:
+            return
+        text, self.lines = "\n".join(self.lines), []
+        pages = list(pagify(text)) or [None]
+        for i, page in enumerate(pages):
+            # The embed goes with the last page, right above the prompt it belongs to
+            await self.ctx.send(page, embed=embed if i == len(pages) - 1 else None)
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Awaitable, Callable
+
+from .perf import PERF
+
+log = logging.getLogger("red.pevent.scheduler")
+
+
+@dataclass
+class SaveStats:
+    requested: int = 0
+    performed: int = 0
+    failed: int = 0
+    last_latency: float = 0.0
+    max_latency: float = 0.0
+    total_latency: float = 0.0
+
+    @property
+    def avg_latency(self) -> float:
+        if not self.performed:
+            return 0.0
+        return self.total_latency / self.performed
+
+    @property
+    def coalesced(self) -> int:
+        """How many save requests were folded into another flush"""
+        return max(0, self.requested - self.performed - self.failed)
+
+
+class SaveScheduler:
+    """Write-behind save scheduler.
+
+    Every call to `request` marks the data dirty. A single worker task waits `delay` seconds
+    so that every mutation made within the window is folded into one flush. Requests that land
+    while a flush is in flight leave the data dirty, so the worker always runs a trailing flush
+    and the last mutation is never dropped. A failed flush leaves the data dirty as well and is
+    retried with exponential backoff, up to `max_backoff` seconds apart.
+    """
+
+    max_backoff = 60.0
+
+    def __init__(self, flush: Callable[[], Awaitable[None]], delay: float = 2.0):
+        self.flush = flush
+        self.delay = delay
+        self.stats = SaveStats()
+
+        self._dirty = False
+        # Requests since the last flush started
+        self._queued = 0
+        self._closing = False
+        # Consecutive failed flushes, drives the retry backoff
+        self._failures = 0
+        self._task: asyncio.Task | None = None
+        self._wake = asyncio.Event()
+        # Held for the duration of each flush
+        self.lock = asyncio.Lock()
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    @property
+    def flushing(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    def request(self) -> None:
+        self.stats.requested += 1
+        self._queued += 1
+        self._dirty = True
+        if self._closing:
+            # close() will pick this up in its final flush
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._worker())
+
+    async def _worker(self) -> None:
+        while self._dirty and not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self._next_delay())
+            except asyncio.TimeoutError:
+                pass
+            if self._closing:
+                # Let close() run the final flush
+                return
+            await self._flush_now()
+
+    def _next_delay(self) -> float:
+        if not self._failures:
+            return self.delay
+        return min(self.max_backoff, max(self.delay, 1.0) * 2 ** self._failures)
+
+    async def _flush_now(self) -> None:
+        self._dirty = False
+        PERF.record("save.queue_depth", self._queued)
+        self._queued = 0
+        start = perf_counter()
+        try:
+            async with self.lock:
+                await self.flush()
+        except Exception as e:
+            self.stats.failed += 1
+            # Keep the worker going so the changes are retried, and so close() still flushes them
+            self._dirty = True
+            self._failures += 1
+            log.exception(f"Failed to save config, retrying in {self._next_delay():.0f}s", exc_info=e)
+            return
+        self._failures = 0
+        elapsed = perf_counter() - start
+        PERF.observe("save.flush", elapsed)
+        self.stats.performed += 1
+        self.stats.last_latency = elapsed
+        self.stats.total_latency += elapsed
+        self.stats.max_latency = max(self.stats.max_latency, elapsed)
+
+    async def close(self) -> None:
+        """Stop the worker and force a final flush if anything is still pending"""
+        self._closing = True
+        self._wake.set()
+        if self._task is not None and not self._task.done():
+            # Either waiting out the window (returns immediately) or mid-flush (let it finish)
+            await self._task
+        if self._dirty:
+            await self._flush_now()
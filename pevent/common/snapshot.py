@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
+
+from . import sync_directory, write_atomic
+
+GLOBAL_SHARD = "global.json"
+INDEX_SUFFIX = ".index"
+
+
+def checksum(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class UserDumps:
+    """Users of a guild that still have to be serialized, done once by whoever needs them first.
+
+    Holds a function over a copy of the guild's user columns taken on the event loop, so serializing them
+    in full happens in the writer thread without ever reading a user that commands are still changing.
+    """
+
+    __slots__ = ("_render", "_lock", "dumps")
+
+    def __init__(self, render: Callable[[], dict[int, bytes]]):
+        self._render = render
+        self._lock = threading.Lock()
+        # User id -> serialized user, None until `result` first ran
+        self.dumps: dict[int, bytes] | None = None
+
+    def result(self) -> dict[int, bytes]:
+        with self._lock:
+            if self.dumps is None:
+                self.dumps = self._render()
+                self._render = None
+            return self.dumps
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Point-in-time copy of the DB that is safe to serialize off the event loop.
+
+    Loaded guilds are held as a dict of user id -> serialized user, which the DB replaces rather than
+    mutates, or as `UserDumps` if they were never serialized before. Guilds that were never loaded are
+    held as their raw JSON or shard file.
+    """
+
+    settings: dict[str, Any]
+    guilds: dict[int, dict[int, bytes] | UserDumps | bytes | Path]
+
+    def guild_json(self, gid: int) -> bytes:
+        guild = self.guilds[gid]
+        if isinstance(guild, UserDumps):
+            guild = guild.result()
+        if isinstance(guild, Path):
+            return guild.read_bytes()
+        if isinstance(guild, bytes):
+            return guild
+        return b'{"users":{' + b",".join(b'"%d":%s' % (uid, dump) for uid, dump in guild.items()) + b"}}"
+
+    def iter_users(self) -> Iterator[tuple[int, int, dict[str, Any]]]:
+        """Yield (guild id, user id, non-default fields) for every user"""
+        for gid, guild in self.guilds.items():
+            if isinstance(guild, UserDumps):
+                guild = guild.result()
+            if isinstance(guild, dict):
+                for uid, dump in guild.items():
+                    yield gid, uid, json.loads(dump)
+            else:
+                for uid, fields in json.loads(self.guild_json(gid)).get("users", {}).items():
+                    yield gid, int(uid), fields
+
+    def to_file(self, path: Path) -> int:
+        """Write the DB one guild at a time, recording where each guild lives in a sidecar index"""
+        parts = [b'{"configs":{']
+        offset = len(parts[0])
+        guilds = {}
+        for gid in self.guilds:
+            dump = self.guild_json(gid)
+            prefix = f'{"," if guilds else ""}"{gid}":'.encode("utf-8")
+            start = offset + len(prefix)
+            offset = start + len(dump)
+            guilds[gid] = (start, offset)
+            parts.append(prefix)
+            parts.append(dump)
+        parts.append(b"}," + json.dumps(self.settings, separators=(",", ":")).encode("utf-8")[1:])
+        data = b"".join(parts)
+        written = write_atomic(path, data)
+
+        stat = path.stat()
+        index = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            # Lets the loader trust the file and skip validation as long as nobody else edited it
+            "checksum": checksum(data),
+            "settings": self.settings,
+            "guilds": guilds,
+        }
+        write_atomic(path.with_name(path.name + INDEX_SUFFIX), json.dumps(index, separators=(",", ":")))
+        return written
+
+    def to_shards(
+        self,
+        directory: Path,
+        guild_ids: Iterable[int] | None = None,
+        write_global: bool = True,
+    ) -> int:
+        """Write each guild to its own shard file, or only `guild_ids` if given. Returns the bytes written"""
+        directory.mkdir(parents=True, exist_ok=True)
+        written = 0
+        for gid in self.guilds if guild_ids is None else guild_ids:
+            shard = directory / f"{gid}.json"
+            guild = self.guilds.get(gid)
+            if guild is None:
+                # The guild is gone
+                shard.unlink(missing_ok=True)
+                continue
+            if guild == shard:
+                continue
+            written += write_atomic(shard, self.guild_json(gid), sync_dir=False)
+        if write_global or not (directory / GLOBAL_SHARD).exists():
+            dump = json.dumps(self.settings, separators=(",", ":"))
+            written += write_atomic(directory / GLOBAL_SHARD, dump, sync_dir=False)
+        sync_directory(directory)
+        return written
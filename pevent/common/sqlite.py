@@ -0,0 +1,346 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import weakref
+from collections.abc import Iterator, Mapping, MutableMapping
+from functools import partial
+from pathlib import Path
+from typing import Any
+
+import discord
+
+from .models import DB, DB_FIELDS, DEFAULT_USER, STAT_FIELDS, USER_FIELDS, GuildSettings, GuildStats, Listener, User
+from .perf import PERF
+from .snapshot import Snapshot
+
+# Column order for the users table, matches the User model
+COLUMNS = tuple(User.model_fields)
+SETTINGS = tuple(f for f in DB.model_fields if f != "configs")
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS guilds (
+    guild_id INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS users (
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    {", ".join(f"{c} INTEGER NOT NULL DEFAULT 0" for c in COLUMNS)},
+    PRIMARY KEY (guild_id, user_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS users_by_user ON users (user_id);
+"""
+
+
+class SQLiteUsers(MutableMapping):
+    """`GuildSettings.users` lookalike, each access is an indexed query"""
+
+    def __init__(self, db: SQLiteDB, gid: int):
+        self.db = db
+        self.gid = gid
+
+    def __getitem__(self, uid: int) -> User:
+        user = self.db._load_user(self.gid, uid)
+        if user is None:
+            raise KeyError(uid)
+        return user
+
+    def __setitem__(self, uid: int, user: User) -> None:
+        self.db._store_user(self.gid, uid, user)
+
+    def __delitem__(self, uid: int) -> None:
+        if not self.db._execute("DELETE FROM users WHERE guild_id = ? AND user_id = ?", (self.gid, uid)):
+            raise KeyError(uid)
+        self.db._users.pop((self.gid, uid), None)
+
+    def __iter__(self) -> Iterator[int]:
+        rows = self.db._query("SELECT user_id FROM users WHERE guild_id = ?", (self.gid,))
+        return (row[0] for row in rows)
+
+    def __len__(self) -> int:
+        return self.db._query("SELECT COUNT(*) FROM users WHERE guild_id = ?", (self.gid,))[0][0]
+
+    def __contains__(self, uid: object) -> bool:
+        return bool(self.db._query("SELECT 1 FROM users WHERE guild_id = ? AND user_id = ?", (self.gid, uid)))
+
+    def items(self) -> list[tuple[int, User]]:
+        """Every user of the guild in one query, instead of one per user"""
+        return self.db._load_users(self.gid)
+
+    def values(self) -> list[User]:
+        return [user for _, user in self.db._load_users(self.gid)]
+
+
+class SQLiteGuild:
+    """`GuildSettings` lookalike for a single guild"""
+
+    def __init__(self, db: SQLiteDB, gid: int):
+        self.db = db
+        self.gid = gid
+        self.users = SQLiteUsers(db, gid)
+
+    def get_user(self, user: discord.User | int) -> User:
+        uid = user if isinstance(user, int) else user.id
+        user_data = self.db._load_user(self.gid, uid)
+        if user_data is None:
+            user_data = User()
+            self.db._store_user(self.gid, uid, user_data)
+        return user_data
+
+    def peek_user(self, user: discord.User | int) -> User:
+        uid = user if isinstance(user, int) else user.id
+        user_data = self.db._load_user(self.gid, uid)
+        return DEFAULT_USER if user_data is None else user_data
+
+    @property
+    def stats(self) -> GuildStats:
+        stats = self.db._stats.get(self.gid)
+        if stats is None:
+            stats = self.db._stats[self.gid] = self.db._count_stats(self.gid)
+        return stats
+
+    def verify_stats(self) -> dict[str, tuple[int, int]]:
+        actual = self.db._count_stats(self.gid)
+        drift = self.stats.drift(actual)
+        self.db._stats[self.gid] = actual
+        return drift
+
+
+class SQLiteGuilds(Mapping):
+    """`DB.configs` lookalike"""
+
+    def __init__(self, db: SQLiteDB):
+        self.db = db
+
+    def __getitem__(self, gid: int) -> SQLiteGuild:
+        if gid not in self:
+            raise KeyError(gid)
+        return SQLiteGuild(self.db, gid)
+
+    def __iter__(self) -> Iterator[int]:
+        rows = self.db._query("SELECT guild_id FROM guilds")
+        return (row[0] for row in rows)
+
+    def __len__(self) -> int:
+        return self.db._query("SELECT COUNT(*) FROM guilds")[0][0]
+
+    def __contains__(self, gid: object) -> bool:
+        return bool(self.db._query("SELECT 1 FROM guilds WHERE guild_id = ?", (gid,)))
+
+
+class SQLiteDB:
+    """`DB` lookalike backed by a SQLite database.
+
+    Users are read on demand and every field change is written through to its row inside an open
+    transaction, `commit` (called by the save scheduler) makes the batch durable. Live `User` objects
+    are shared through a weak cache so two commands holding the same user never overwrite each other.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        # Columns added to User after the database was created
+        existing = {row[1] for row in self.conn.execute("PRAGMA table_info(users)")}
+        for column in COLUMNS:
+            if column not in existing:
+                self.conn.execute(f"ALTER TABLE users ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+        # The connection is shared between the event loop and the flush thread
+        self.lock = threading.Lock()
+        self.configs = SQLiteGuilds(self)
+
+        self._settings: dict[str, Any] = DB().model_dump(include=set(SETTINGS), exclude_defaults=False)
+        for key, value in self.conn.execute("SELECT key, value FROM settings"):
+            if key in self._settings:
+                self._settings[key] = json.loads(value)
+        self._users: weakref.WeakValueDictionary[tuple[int, int], User] = weakref.WeakValueDictionary()
+        self._listeners: list[Listener] = []
+        self._dirty: set[int] = set()
+        self._dirty_global = False
+        # Guild totals counted on first use, then adjusted by `_notify`
+        self._stats: dict[int, GuildStats] = {}
+
+    def __getattr__(self, name: str) -> Any:
+        settings = self.__dict__.get("_settings", {})
+        if name in settings:
+            return settings[name]
+        raise AttributeError(name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name not in DB_FIELDS or name == "configs":
+            return super().__setattr__(name, value)
+        old = self._settings[name]
+        if old == value:
+            return
+        self._settings[name] = value
+        self._execute(
+            "INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            (name, json.dumps(value)),
+        )
+        self._notify(None, None, name, old, value)
+
+    def _execute(self, sql: str, params: tuple = ()) -> int:
+        with self.lock:
+            return self.conn.execute(sql, params).rowcount
+
+    def _query(self, sql: str, params: tuple = ()) -> list[tuple]:
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def _load_user(self, gid: int, uid: int) -> User | None:
+        user = self._users.get((gid, uid))
+        if user is not None:
+            return user
+        rows = self._query(
+            f"SELECT {', '.join(COLUMNS)} FROM users WHERE guild_id = ? AND user_id = ?",
+            (gid, uid),
+        )
+        if not rows:
+            return None
+        user = User.model_validate(dict(zip(COLUMNS, rows[0])))
+        return self._bind(gid, uid, user)
+
+    def _load_users(self, gid: int) -> list[tuple[int, User]]:
+        rows = self._query(f"SELECT user_id, {', '.join(COLUMNS)} FROM users WHERE guild_id = ?", (gid,))
+        users = []
+        for uid, *values in rows:
+            # A user some command already holds is shared, the same way `_load_user` shares it
+            user = self._users.get((gid, uid))
+            if user is None:
+                user = self._bind(gid, uid, User.model_validate(dict(zip(COLUMNS, values))))
+            users.append((uid, user))
+        return users
+
+    def _count_stats(self, gid: int) -> GuildStats:
+        sums = ", ".join(f"COALESCE(SUM({c}), 0)" for c in (*STAT_FIELDS, "has_active_deposit"))
+        row = self._query(f"SELECT {sums} FROM users WHERE guild_id = ?", (gid,))[0]
+        return GuildStats(*row)
+
+    def _store_user(self, gid: int, uid: int, user: User) -> None:
+        with self.lock:
+            self.conn.execute("INSERT OR IGNORE INTO guilds (guild_id) VALUES (?)", (gid,))
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO users (guild_id, user_id, {', '.join(COLUMNS)}) "
+                f"VALUES (?, ?, {', '.join('?' * len(COLUMNS))})",
+                (gid, uid, *(int(getattr(user, c)) for c in COLUMNS)),
+            )
+        self._bind(gid, uid, user)
+
+    def _bind(self, gid: int, uid: int, user: User) -> User:
+        user._on_change = partial(self._notify, gid, uid)
+        self._users[(gid, uid)] = user
+        return user
+
+    def get_conf(self, guild: discord.Guild | int) -> SQLiteGuild:
+        gid = guild if isinstance(guild, int) else guild.id
+        # The guild row is created along with its first user
+        return SQLiteGuild(self, gid)
+
+    def add_listener(self, listener: Listener) -> None:
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Listener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, gid: int | None, uid: int | None, field: str, old: Any, new: Any) -> None:
+        if gid is None:
+            self._dirty_global = True
+        else:
+            self._dirty.add(gid)
+            if field in USER_FIELDS:
+                updated = self._execute(
+                    f"UPDATE users SET {field} = ? WHERE guild_id = ? AND user_id = ?",
+                    (int(new), gid, uid),
+                )
+                if not updated and (user := self._users.get((gid, uid))) is not None:
+                    # Compacted away while a command was still holding it
+                    self._store_user(gid, uid, user)
+                if (stats := self._stats.get(gid)) is not None:
+                    stats.apply(field, old, new)
+        for listener in self._listeners:
+            listener(gid, uid, field, old, new)
+
+    def active_deposits(self) -> Iterator[tuple[int, int, int]]:
+        rows = self._query("SELECT guild_id, user_id, last_deposit_at FROM users WHERE has_active_deposit")
+        return iter(rows)
+
+    def compact_users(self) -> int:
+        where = " AND ".join(f"{c} = 0" for c in COLUMNS)
+        removed = self._execute(f"DELETE FROM users WHERE {where}")
+        self._execute("DELETE FROM guilds WHERE guild_id NOT IN (SELECT guild_id FROM users)")
+        return removed
+
+    def apply(self, gid: int | None, uid: int | None, field: str, value: Any) -> None:
+        if gid is None:
+            setattr(self, field, value)
+        else:
+            setattr(self.get_conf(gid).get_user(uid), field, value)
+
+    def take_dirty(self) -> tuple[set[int], bool]:
+        dirty, self._dirty = self._dirty, set()
+        dirty_global, self._dirty_global = self._dirty_global, False
+        return dirty, dirty_global
+
+    def mark_dirty(self, guild_ids=(), dirty_global: bool = False) -> None:
+        self._dirty.update(guild_ids)
+        self._dirty_global = self._dirty_global or dirty_global
+
+    def commit(self) -> None:
+        with self.lock:
+            self.conn.commit()
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+    def import_snapshot(self, snapshot: Snapshot) -> None:
+        """One-shot import of a full snapshot, replacing everything stored"""
+        defaults = User().model_dump(exclude_defaults=False)
+        with self.lock:
+            self.conn.execute("DELETE FROM users")
+            self.conn.execute("DELETE FROM guilds")
+            self.conn.executemany("INSERT INTO guilds (guild_id) VALUES (?)", ((gid,) for gid in snapshot.guilds))
+            self.conn.executemany(
+                f"INSERT INTO users (guild_id, user_id, {', '.join(COLUMNS)}) "
+                f"VALUES (?, ?, {', '.join('?' * len(COLUMNS))})",
+                (
+                    (gid, uid, *(int(fields.get(c, defaults[c])) for c in COLUMNS))
+                    for gid, uid, fields in snapshot.iter_users()
+                ),
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                ((key, json.dumps(snapshot.settings[key])) for key in SETTINGS if key in snapshot.settings),
+            )
+            self.conn.commit()
+        self._users.clear()
+        self._stats.clear()
+        for key in SETTINGS:
+            if key in snapshot.settings:
+                self._settings[key] = snapshot.settings[key]
+
+    def to_model(self) -> DB:
+        """Materialize the whole database as an in-memory DB"""
+        db = DB(**self._settings)
+        with self.lock:
+            guild_ids = [row[0] for row in self.conn.execute("SELECT guild_id FROM guilds")]
+            rows = self.conn.execute(f"SELECT guild_id, user_id, {', '.join(COLUMNS)} FROM users").fetchall()
+        for gid in guild_ids:
+            db.configs[gid] = GuildSettings()
+        for gid, uid, *values in rows:
+            db.configs.setdefault(gid, GuildSettings()).users[uid] = User.model_validate(dict(zip(COLUMNS, values)))
+        return db
+
+
+PERF.instrument(SQLiteDB, "get_conf", "db.get_conf")
+PERF.instrument(SQLiteGuild, "get_user", "db.get_user")
+PERF.instrument(SQLiteGuild, "peek_user", "db.peek_user")
@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+from collections import deque
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable
+
+from . import write_atomic
+from .models import DB, GLOBAL_SHARD
+from .perf import PERF
+from .snapshot import Snapshot
+from .sqlite import SQLiteDB
+
+log = logging.getLogger("red.pevent.storage")
+
+MODE_FILE = "storage.json"
+
+# Every storage splits a save in two: `prepare` runs on the event loop and captures what needs writing,
+# the writer it returns does the I/O off the loop and returns the bytes written.
+Writer = Callable[[], int]
+
+
+class JSONStorage:
+    """Everything in a single db.json, rewritten on every save"""
+
+    mode = "json"
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.path = root / "db.json"
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def attach(self, db: DB) -> None:
+        pass
+
+    def detach(self, db: DB) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def load(self) -> DB:
+        return DB.from_file(self.path, lazy=True)
+
+    async def prepare(self, db: DB, guild_ids: set[int], write_global: bool) -> Writer:
+        snapshot = await db.snapshot_async()
+        return partial(snapshot.to_file, self.path)
+
+    def write_all(self, snapshot: Snapshot) -> int:
+        return snapshot.to_file(self.path)
+
+    def retire(self) -> None:
+        if self.path.exists():
+            self.path.replace(self.path.with_name(f"{self.path.name}.bak"))
+
+
+class ShardedStorage:
+    """One file per guild plus a global file, only changed guilds are rewritten"""
+
+    mode = "sharded"
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.directory = root / "shards"
+
+    def exists(self) -> bool:
+        return (self.directory / GLOBAL_SHARD).exists()
+
+    def attach(self, db: DB) -> None:
+        pass
+
+    def detach(self, db: DB) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def load(self) -> DB:
+        # Migrates an existing db.json on first load
+        return DB.from_file(self.root / "db.json", shard_dir=self.directory, lazy=True)
+
+    async def prepare(self, db: DB, guild_ids: set[int], write_global: bool) -> Writer:
+        snapshot = await db.snapshot_async(guild_ids)
+        return partial(snapshot.to_shards, self.directory, guild_ids, write_global)
+
+    def write_all(self, snapshot: Snapshot) -> int:
+        return snapshot.to_shards(self.directory)
+
+    def retire(self) -> None:
+        if not self.directory.exists():
+            return
+        backup = self.root / "shards.bak"
+        if backup.exists():
+            shutil.rmtree(backup)
+        self.directory.replace(backup)
+
+
+class JournalStorage:
+    """A snapshot plus an append-only log of field changes.
+
+    Changes are queued by a DB listener and appended with a single fsync per save (group commit).
+    Records hold the new value rather than a delta so replaying one twice is harmless, which lets
+    `compact` fold the log into a fresh snapshot without stopping writers.
+    """
+
+    mode = "journal"
+    # Fold the journal into the snapshot once it grows past this many bytes
+    compact_threshold = 1024 * 1024
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.directory = root / "journal"
+        self.snapshot = self.directory / "snapshot.json"
+        self.journal = self.directory / "journal.log"
+        self._pending: deque[str] = deque()
+
+    def exists(self) -> bool:
+        return self.snapshot.exists()
+
+    def attach(self, db: DB) -> None:
+        db.add_listener(self._record)
+
+    def detach(self, db: DB) -> None:
+        db.remove_listener(self._record)
+
+    def close(self) -> None:
+        pass
+
+    def _record(self, gid: int | None, uid: int | None, field: str, old: Any, new: Any) -> None:
+        self._pending.append(json.dumps({"g": gid, "u": uid, "f": field, "v": new}, separators=(",", ":")))
+
+    def load(self) -> DB:
+        if not self.snapshot.exists():
+            # Start from the monolithic file, the first save writes the snapshot
+            return DB.from_file(self.root / "db.json")
+        db = DB.from_file(self.snapshot, lazy=True)
+        if not self.journal.exists():
+            return db
+        replayed = 0
+        with self.journal.open("rb") as fs:
+            for line in fs:
+                try:
+                    record = json.loads(line)
+                    db.apply(record["g"], record["u"], record["f"], record["v"])
+                except (ValueError, KeyError) as e:
+                    # Most likely a torn write at the end of the log
+                    log.warning(f"Skipping bad journal record {line!r}", exc_info=e)
+                    continue
+                replayed += 1
+        db.take_dirty()
+        log.info(f"Replayed {replayed} journal records")
+        return db
+
+    async def prepare(self, db: DB, guild_ids: set[int], write_global: bool) -> Writer:
+        if not self.snapshot.exists():
+            self._pending.clear()
+            return partial(self.write_all, await db.snapshot_async())
+        return self._append
+
+    def _append(self) -> int:
+        batch = []
+        while self._pending:
+            batch.append(self._pending.popleft())
+        if not batch:
+            return 0
+        data = ("\n".join(batch) + "\n").encode("utf-8")
+        try:
+            with self.journal.open("ab") as fs:
+                fs.write(data)
+                fs.flush()
+                os.fsync(fs.fileno())
+        except Exception:
+            self._pending.extendleft(reversed(batch))
+            raise
+        PERF.record("write.bytes", len(data), unit="B")
+        PERF.count("write.bytes_total", len(data))
+        return len(data)
+
+    def write_all(self, snapshot: Snapshot) -> int:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        written = snapshot.to_file(self.snapshot)
+        write_atomic(self.journal, b"")
+        return written
+
+    def journal_size(self) -> int:
+        try:
+            return self.journal.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def needs_compaction(self) -> bool:
+        return self.journal_size() > self.compact_threshold
+
+    def compact(self, snapshot: Snapshot) -> int:
+        """Write a fresh snapshot and truncate the journal.
+
+        Records still queued are appended to the new journal on the next save, replaying them is a no-op.
+        """
+        return self.write_all(snapshot)
+
+    def retire(self) -> None:
+        if not self.directory.exists():
+            return
+        backup = self.root / "journal.bak"
+        if backup.exists():
+            shutil.rmtree(backup)
+        self.directory.replace(backup)
+
+
+class SQLiteStorage:
+    """A SQLite database in WAL mode, users are loaded on demand and written through"""
+
+    mode = "sqlite"
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.path = root / "db.sqlite3"
+        self.db: SQLiteDB | None = None
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def attach(self, db: SQLiteDB) -> None:
+        pass
+
+    def detach(self, db: SQLiteDB) -> None:
+        pass
+
+    def close(self) -> None:
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def load(self) -> SQLiteDB:
+        if self.db is not None:
+            return self.db
+        legacy = self.root / "db.json"
+        fresh = not self.path.exists()
+        self.db = SQLiteDB(self.path)
+        if fresh and legacy.exists():
+            # One-shot migration from the monolithic file
+            self.db.import_snapshot(DB.from_file(legacy).snapshot())
+            legacy.replace(legacy.with_name(f"{legacy.name}.bak"))
+        return self.db
+
+    async def prepare(self, db: SQLiteDB, guild_ids: set[int], write_global: bool) -> Writer:
+        # Changes are already written through, committing makes them durable
+        return partial(self._commit, db)
+
+    def _commit(self, db: SQLiteDB) -> int:
+        db.commit()
+        return 0
+
+    def write_all(self, snapshot: Snapshot) -> int:
+        if self.db is None:
+            self.db = SQLiteDB(self.path)
+        self.db.import_snapshot(snapshot)
+        return self.path.stat().st_size
+
+    def retire(self) -> None:
+        self.close()
+        for suffix in ("-wal", "-shm"):
+            self.path.with_name(self.path.name + suffix).unlink(missing_ok=True)
+        if self.path.exists():
+            self.path.replace(self.path.with_name(f"{self.path.name}.bak"))
+
+
+Storage = JSONStorage | ShardedStorage | JournalStorage | SQLiteStorage
+STORAGES: dict[str, type[Storage]] = {
+    JSONStorage.mode: JSONStorage,
+    ShardedStorage.mode: ShardedStorage,
+    JournalStorage.mode: JournalStorage,
+    SQLiteStorage.mode: SQLiteStorage,
+}
+
+
+def get_storage(root: Path) -> Storage:
+    """Return the storage backend selected in the mode file, defaulting to a single db.json"""
+    mode_file = root / MODE_FILE
+    mode = JSONStorage.mode
+    if mode_file.exists():
+        try:
+            mode = json.loads(mode_file.read_text())["mode"]
+        except (ValueError, KeyError) as e:
+            log.error(f"Invalid {MODE_FILE}, falling back to {mode}", exc_info=e)
+    if mode not in STORAGES:
+        log.error(f"Unknown storage mode {mode}, falling back to {JSONStorage.mode}")
+        mode = JSONStorage.mode
+    return STORAGES[mode](root)
+
+
+def migrate_storage(snapshot: Snapshot, old: Storage, new: Storage) -> tuple[SQLiteDB | None, int]:
+    """Write a full snapshot into `new`, select it, then move the old layout aside.
+
+    Returns the database to switch to if `new` is not backed by the in-memory DB, and the bytes written.
+    """
+    written = new.write_all(snapshot)
+    write_atomic(new.root / MODE_FILE, json.dumps({"mode": new.mode}))
+    old.retire()
+    if isinstance(new, SQLiteStorage):
+        return new.load(), written
+    return None, written
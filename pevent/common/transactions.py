@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Literal
+
+import discord
+from redbot.core import bank
+
+from .perf import PERF
+
+log = logging.getLogger("red.pevent.transactions")
+
+
+class UserLocks:
+    """One `asyncio.Lock` per (guild, user), created on demand.
+
+    Locks are only weakly held here, so one lives exactly as long as some flow is holding or waiting on it.
+    """
+
+    def __init__(self):
+        self._locks: weakref.WeakValueDictionary[tuple[int, int], asyncio.Lock] = weakref.WeakValueDictionary()
+
+    def __call__(self, gid: int, uid: int) -> asyncio.Lock:
+        lock = self._locks.get((gid, uid))
+        if lock is None:
+            lock = self._locks[(gid, uid)] = asyncio.Lock()
+        return lock
+
+
+@dataclass
+class Transaction:
+    key: str
+    kind: Literal["withdraw", "deposit"]
+    guild_id: int
+    user_id: int
+    amount: int
+    status: Literal["pending", "done", "failed"] = "pending"
+    created: float = 0.0
+
+
+def deposit_key(gid: int, uid: int, message_id: int) -> str:
+    """Key of the withdrawal made for the `pdeposit` invoked by message `message_id`"""
+    return f"{gid}:{uid}:deposit:{message_id}"
+
+
+def refund_key(gid: int, uid: int, stamp: int) -> str:
+    """Key of the refund of the deposit stamped `stamp`"""
+    return f"{gid}:{uid}:refund:{stamp}"
+
+
+class BankLedger:
+    """Runs bank calls under a key so the same logical transaction is applied at most once.
+
+    A key that is pending or done is refused, a failed one may be retried. Only the most recent
+    `history` records are kept, older deposits are protected by their cleared `has_active_deposit`.
+    """
+
+    def __init__(self, history: int = 10_000):
+        self.history = history
+        self.records: OrderedDict[str, Transaction] = OrderedDict()
+
+    async def withdraw(self, key: str, member: discord.Member, amount: int) -> bool:
+        return await self._run(key, "withdraw", member, amount)
+
+    async def deposit(self, key: str, member: discord.Member, amount: int) -> bool:
+        return await self._run(key, "deposit", member, amount)
+
+    async def _run(self, key: str, kind: Literal["withdraw", "deposit"], member: discord.Member, amount: int) -> bool:
+        """Returns False without calling the bank if `key` was already applied or is in flight"""
+        record = self.records.get(key)
+        if record is not None and record.status != "failed":
+            log.info(f"Skipping duplicate {kind} {key} ({record.status})")
+            return False
+        record = Transaction(key, kind, member.guild.id, member.id, amount, created=time.time())
+        self.records[key] = record
+        self.records.move_to_end(key)
+        while len(self.records) > self.history:
+            self.records.popitem(last=False)
+
+        call = bank.withdraw_credits if kind == "withdraw" else bank.deposit_credits
+        try:
+            with PERF.timer(f"bank.{kind}_credits"):
+                await call(member, amount)
+        except Exception:
+            record.status = "failed"
+            raise
+        record.status = "done"
+        return True
@@ -1,5 +1,6 @@
 import asyncio
 import logging
+import time
 
 from pydantic import ValidationError
 from redbot.core import commands
@@ -8,7 +9,16 @@ from redbot.core.data_manager import cog_data_path
 
 from .abc import CompositeMetaClass
 from .commands import Commands
+from .common.expiry import DepositDeadlines
+from .common.history import HistoryStore
+from .common.indexes import FlagSets, Rankings
 from .common.models import DB
+from .common.perf import PERF
+from .common.prompts import PromptDispatcher
+from .common.sqlite import SQLiteDB
+from .common.scheduler import SaveScheduler
+from .common.storage import STORAGES, get_storage, migrate_storage
+from .common.transactions import BankLedger, UserLocks
 from .tasks import TaskLoops
 
 log = logging.getLogger("red.pevent")
@@ -24,9 +34,31 @@ class PEvent(Commands, TaskLoops, commands.Cog, metaclass=CompositeMetaClass):
         super().__init__()
         self.bot: Red = bot
         self.db: DB = DB()
+        self.storage = get_storage(cog_data_path(self))
 
-        # States
-        self._saving = False
+        # Set once the real DB is loaded, commands and flushes wait on it instead of touching a throwaway DB
+        self.ready = asyncio.Event()
+        # Set once `initialize` is over, whether it succeeded or not
+        self.started = asyncio.Event()
+
+        # Leaderboards for `pevent top`, built per guild on first use and kept current from then on
+        self.rankings = Rankings()
+        # Who holds a deposit, may deposit or is banned, per guild, for the listing subcommands
+        self.flag_sets = FlagSets()
+        # When each active deposit expires, drives the `expire_deposits` loop
+        self.deposit_deadlines = DepositDeadlines()
+        # Append-only event log with daily rollups, for the windowed stats
+        self.history = HistoryStore(self.storage.root / "history")
+
+        # Deposit and refund flows are serialized per member, and each bank call is applied at most once
+        self.user_locks = UserLocks()
+        self.bank_ledger = BankLedger()
+
+        # Confirmation prompts wait on this instead of each registering a `wait_for` listener
+        self.prompts = PromptDispatcher()
+
+        # Write-behind saving, mutations within `DB.save_delay` seconds share one flush
+        self.saver = SaveScheduler(self._flush, delay=self.db.save_delay)
 
     def format_help_for_context(self, ctx: commands.Context):
         helpcmd = super().format_help_for_context(ctx)
@@ -39,31 +71,124 @@ class PEvent(Commands, TaskLoops, commands.Cog, metaclass=CompositeMetaClass):
     async def red_get_data_for_user(self, *args, **kwargs):
         return
 
+    async def cog_before_invoke(self, ctx: commands.Context) -> None:
+        if PERF.enabled:
+            # Includes any wait for startup, the caller sees that too
+            ctx.pevent_started = time.perf_counter()
+        await self.started.wait()
+        if not self.ready.is_set():
+            raise commands.UserFeedbackCheckFailure("PEvent failed to start, check the bot logs.")
+
+    async def cog_after_invoke(self, ctx: commands.Context) -> None:
+        started = getattr(ctx, "pevent_started", None)
+        if started is not None:
+            PERF.observe(f"command.{ctx.command.qualified_name}", time.perf_counter() - started)
+
     async def cog_load(self) -> None:
         asyncio.create_task(self.initialize())
 
+    async def cog_unload(self) -> None:
+        self.compact_journal.cancel()
+        self.compact_default_users.cancel()
+        self.expire_deposits.cancel()
+        self.compact_history.cancel()
+        self.prompts.close()
+        await self.saver.close()
+        if self.ready.is_set():
+            # Saves the replay of today's events on the next load
+            writer = self.history.checkpoint()
+            if writer is not None:
+                try:
+                    await asyncio.to_thread(writer)
+                except Exception as e:
+                    log.exception("Failed to checkpoint the event history", exc_info=e)
+        # Put the uninstrumented methods back for the next load
+        PERF.disable()
+        self.storage.close()
+        stats = self.saver.stats
+        log.info(
+            f"Saves requested: {stats.requested}, performed: {stats.performed}, "
+            f"avg flush: {stats.avg_latency * 1000:.1f}ms"
+        )
+
     async def initialize(self) -> None:
+        try:
+            await self._initialize()
+        except Exception as e:
+            # Commands fail fast instead of waiting on `ready` forever, nothing is saved over the data
+            log.exception("PEvent failed to start", exc_info=e)
+        finally:
+            self.started.set()
+
+    async def _initialize(self) -> None:
         await self.bot.wait_until_red_ready()
-        db_file = cog_data_path(self) / "db.json"
         try:
-            self.db = await asyncio.to_thread(DB.from_file, db_file)
+            self.db = await asyncio.to_thread(self.storage.load)
         except (FileNotFoundError, ValidationError):
             self.db = DB()
+            self.db.mark_dirty(dirty_global=True)
             self.save()  # Create initial file
-        log.info("Config loaded")
+        self.storage.attach(self.db)
+        self.rankings.attach(self.db)
+        self.flag_sets.attach(self.db)
+        self.deposit_deadlines.attach(self.db)
+        await asyncio.to_thread(self.history.load)
+        self.history.attach(self.db)
+        # Deposits made before now are scanned for by `expire_deposits`, and only once expiry is enabled
+        self.saver.delay = self.db.save_delay
+        self.compact_journal.start()
+        self.compact_default_users.start()
+        self.expire_deposits.start()
+        self.compact_history.start()
+        self.ready.set()
+        log.info(f"Config loaded ({self.storage.mode} storage, {getattr(self.db, 'pending', 0)} guilds deferred)")
 
     def save(self) -> None:
-        async def _save():
-            if self._saving:
-                return
-            try:
-                self._saving = True
-                db_file = cog_data_path(self) / "db.json"
-                await asyncio.to_thread(self.db.to_file, db_file)
-            except Exception as e:
-                log.exception("Failed to save config", exc_info=e)
-            finally:
-                self._saving = False
-
-        asyncio.create_task(_save())
+        self.saver.request()
 
+    async def _flush(self) -> None:
+        if not self.ready.is_set():
+            # Nothing but the placeholder DB to write yet
+            return
+        guild_ids, write_global = self.db.take_dirty()
+        try:
+            # Capture on the loop, serialize and write off it
+            writer = await self.storage.prepare(self.db, guild_ids, write_global)
+            written = await asyncio.to_thread(writer)
+            PERF.record("save.bytes", written, unit="B")
+        except Exception:
+            # Keep them pending for the next flush
+            self.db.mark_dirty(guild_ids, write_global)
+            raise
+        # Only appends the new event rows, queued rows go back to the history on failure by themselves
+        history_writer = self.history.prepare()
+        if history_writer is not None:
+            written = await asyncio.to_thread(history_writer)
+            PERF.record("save.history_bytes", written, unit="B")
+
+    async def set_storage(self, mode: str) -> int:
+        new = STORAGES[mode](self.storage.root)
+        # Hold off flushes so nothing is written to the old layout after the switch
+        async with self.saver.lock:
+            self.db.take_dirty()
+            self.storage.detach(self.db)
+            if isinstance(self.db, SQLiteDB):
+                model = await asyncio.to_thread(self.db.to_model)
+            else:
+                # Pending guilds may point into the layout being retired
+                self.db.load_all()
+                model = self.db
+            snapshot = await model.snapshot_async()
+            db, written = await asyncio.to_thread(migrate_storage, snapshot, self.storage, new)
+            self.db = db or model
+            new.attach(self.db)
+            self.rankings.attach(self.db)
+            self.flag_sets.attach(self.db)
+            self.deposit_deadlines.attach(self.db)
+            self.history.attach(self.db)
+            if self.db.deposit_expiry_hours:
+                # Every guild was loaded above, so this never parses raw JSON
+                self.deposit_deadlines.rebuild(self.db.active_deposits(), self.db.deposit_expiry_hours * 3600)
+            self.storage = new
+        log.info(f"Switched to {mode} storage")
+        return written
@@ -1,8 +1,12 @@
 # Task loops can be defined here
 from ..abc import CompositeMetaClass
+from .compaction import UserCompaction
+from .expiry import DepositExpiry
+from .history import HistoryCompaction
+from .journal import JournalCompaction
 
 
-class TaskLoops(metaclass=CompositeMetaClass):
+class TaskLoops(DepositExpiry, HistoryCompaction, JournalCompaction, UserCompaction, metaclass=CompositeMetaClass):
     """
     Subclass all task loops in this directory so you can import this single task loop class in your cog's class constructor.
 
@@ -0,0 +1,23 @@
+import logging
+
+from discord.ext import tasks
+
+from ..abc import MixinMeta
+
+log = logging.getLogger("red.pevent.tasks")
+
+
+class UserCompaction(MixinMeta):
+    @tasks.loop(hours=1)
+    async def compact_default_users(self):
+        """Drop users whose stats are all default so the DB only grows with real event hosts"""
+        if not self.ready.is_set():
+            return
+        try:
+            removed = self.db.compact_users()
+        except Exception as e:
+            log.exception("User compaction failed", exc_info=e)
+            return
+        if removed:
+            log.info(f"Compacted {removed} default users")
+            self.save()
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import time
+
+import discord
+from discord.ext import tasks
+
+from ..abc import MixinMeta
+from ..common.models import DB
+from ..common.sqlite import SQLiteDB
+
+log = logging.getLogger("red.pevent.tasks")
+
+
+class DepositExpiry(MixinMeta):
+    @tasks.loop(seconds=0)
+    async def expire_deposits(self):
+        """Act on every deposit past its deadline, then sleep until the next deadline or change"""
+        expiry = self.db.deposit_expiry_hours * 3600
+        if expiry != self.deposit_deadlines.expiry:
+            self.deposit_deadlines.set_expiry(expiry)
+        if expiry and not self.deposit_deadlines.scanned:
+            try:
+                await self.scan_deposits(expiry)
+            except Exception as e:
+                log.exception("Failed to scan for active deposits", exc_info=e)
+        for gid, uid, stamp in self.deposit_deadlines.pop_due(time.time()):
+            try:
+                await self.expire_deposit(gid, uid, stamp)
+            except Exception as e:
+                log.exception(f"Failed to expire the deposit of {uid} in {gid}", exc_info=e)
+        await self.deposit_deadlines.wait()
+
+    async def scan_deposits(self, expiry: float) -> None:
+        """Put the deposits made before the deadlines were tracked on the heap"""
+        db = self.db
+        if isinstance(db, SQLiteDB):
+            deposits = await asyncio.to_thread(lambda: list(db.active_deposits()))
+        else:
+            # Loaded guilds are read on the loop, pending ones are parsed off it from their raw data
+            deposits = list(db.active_deposits(pending=False))
+            items = db.pending_items()
+            deposits += await asyncio.to_thread(lambda: list(DB.scan_pending(items)))
+        if db is self.db:
+            self.deposit_deadlines.rebuild(deposits, expiry)
+
+    async def expire_deposit(self, gid: int, uid: int, stamp: int) -> None:
+        guild = self.bot.get_guild(gid)
+        if guild is None:
+            return
+        member = guild.get_member(uid)
+        name = member.display_name if member else f"User {uid}"
+        hours = self.db.deposit_expiry_hours
+
+        if self.db.deposit_expiry_action == "cancel":
+            # Serialized with `pevent complete`/`cancel`, which may have resolved the deposit meanwhile
+            async with self.user_locks(gid, uid):
+                guild_config = self.db.get_conf(gid)
+                user_data = guild_config.peek_user(uid)
+                if not user_data.has_active_deposit or user_data.last_deposit_at != stamp:
+                    return
+                user_data = guild_config.get_user(uid)
+                user_data.user_total_cancelled += 1
+                user_data.user_total_cancelled_withoutnotice += 1
+                user_data.has_active_deposit = False
+                user_data.can_make_deposit = False
+                self.save()
+            message = (
+                f"The event deposit {name} made in {guild.name} expired after {hours} hours. "
+                f"The event was marked as cancelled without notice and the deposit was not refunded."
+            )
+            recipients = [member, guild.owner]
+        else:
+            self.deposit_deadlines.remind_later(gid, uid, stamp)
+            message = (
+                f"{name} has held an event deposit in {guild.name} for over {hours} hours. "
+                f"Use `pevent complete` or `pevent cancel` once their event is resolved."
+            )
+            recipients = [guild.owner]
+
+        for recipient in recipients:
+            if recipient is None:
+                continue
+            try:
+                await recipient.send(message)
+            except discord.HTTPException:
+                pass
@@ -0,0 +1,31 @@
+import asyncio
+import logging
+
+from discord.ext import tasks
+
+from ..abc import MixinMeta
+
+log = logging.getLogger("red.pevent.tasks")
+
+
+class HistoryCompaction(MixinMeta):
+    @tasks.loop(hours=24)
+    async def compact_history(self):
+        """Checkpoint the daily rollups, then drop the event partitions and rollups past their retention"""
+        if not self.ready.is_set():
+            return
+        try:
+            # Flushes append to the partitions, and the offsets must match what the checkpoint includes
+            async with self.saver.lock:
+                dropped = self.history.expire_rollups()
+                writer = self.history.checkpoint()
+                if writer is not None:
+                    await asyncio.to_thread(writer)
+                removed = await asyncio.to_thread(self.history.compact)
+        except Exception as e:
+            log.exception("History compaction failed", exc_info=e)
+            return
+        if removed:
+            log.info(f"Removed {len(removed)} event partitions: {', '.join(removed)}")
+        if dropped:
+            log.info(f"Dropped {dropped} expired daily rollups")
@@ -0,0 +1,27 @@
+import asyncio
+import logging
+
+from discord.ext import tasks
+
+from ..abc import MixinMeta
+from ..common.storage import JournalStorage
+
+log = logging.getLogger("red.pevent.tasks")
+
+
+class JournalCompaction(MixinMeta):
+    @tasks.loop(minutes=5)
+    async def compact_journal(self):
+        """Fold the mutation journal into a fresh snapshot once it grows past the threshold"""
+        if not isinstance(self.storage, JournalStorage) or not self.storage.needs_compaction():
+            return
+        size = self.storage.journal_size()
+        try:
+            # No flush may append to the journal while it is being replaced
+            async with self.saver.lock:
+                snapshot = await self.db.snapshot_async()
+                await asyncio.to_thread(self.storage.compact, snapshot)
+        except Exception as e:
+            log.exception("Journal compaction failed", exc_info=e)
+            return
+        log.info(f"Compacted {size} bytes of journal into a new snapshot")
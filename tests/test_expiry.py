@@ -0,0 +1,20 @@
+import heapq
+
+from pevent.common.expiry import DepositDeadlines
+from pevent.common.models import DB
+
+
+def test_pop_due_skips_guild_that_fails_to_load():
+    db = DB()
+    db.get_conf(1).get_user(10).has_active_deposit = True
+    db.get_conf(1).get_user(10).last_deposit_at = 100
+    # Valid JSON that fails validation, so the scan for active deposits cannot catch it
+    db._pending[2] = b'{"users":{"20":{"has_active_deposit":true,"user_total_setup":"x"}}}'
+    deadlines = DepositDeadlines()
+    deadlines.attach(db)
+    deadlines.set_expiry(60)
+    heapq.heappush(deadlines._heap, (0, 2, 20, 100))
+    heapq.heappush(deadlines._heap, (1, 1, 10, 100))
+
+    assert deadlines.pop_due(200) == [(1, 10, 100)]
+    assert len(deadlines) == 0
@@ -0,0 +1,47 @@
+import asyncio
+from collections import Counter
+from types import SimpleNamespace
+
+from choosereact.choosereact import Reservoir, reservoir_sample, sample_ids
+
+
+def test_reservoir_is_uniform():
+    population, count, trials = 20, 5, 4000
+    wins = Counter()
+    for seed in range(trials):
+        wins.update(sample_ids(range(1, population + 1), Reservoir(count, seed)).winners())
+    expected = trials * count / population
+    # Binomial standard deviation is about 27, a fair sampler stays well within 5 of them
+    sigma = (trials * count / population * (1 - count / population)) ** 0.5
+    assert set(wins) == set(range(1, population + 1))
+    assert all(abs(n - expected) < 5 * sigma for n in wins.values()), wins
+    # The last candidates must not be favoured either, as a broken replacement step would do
+    assert abs(sum(wins[i] for i in range(16, 21)) - 5 * expected) < 5 * sigma * 5**0.5
+
+
+def test_reservoir_keeps_everyone_when_short():
+    reservoir = sample_ids({3, 1, 2}, Reservoir(5, 42))
+    assert reservoir.seen == 3
+    assert sorted(reservoir.winners()) == [1, 2, 3]
+
+
+def test_reservoir_replays_from_seed():
+    ids = range(1000, 2000, 7)
+    first = sample_ids(ids, Reservoir(3, 1234))
+    again = sample_ids(reversed(ids), Reservoir(3, 1234))
+    assert first.winners() == again.winners()
+    assert first.digest() == again.digest()
+    assert first.digest() != sample_ids([*ids, 5000], Reservoir(3, 1234)).digest()
+
+
+def test_streamed_sample_matches_ids():
+    users = [SimpleNamespace(id=i, bot=i % 10 == 0) for i in range(1, 200)]
+
+    async def stream():
+        for user in users:
+            yield user
+
+    streamed = asyncio.run(reservoir_sample(stream(), Reservoir(4, 99), allowed=lambda uid: uid % 3))
+    eligible = {user.id for user in users if not user.bot and user.id % 3}
+    assert streamed.seen == len(eligible)
+    assert streamed.winners() == sample_ids(eligible, Reservoir(4, 99)).winners()
@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+
+from pevent.common import json_serializer
+from pevent.common.models import DB, GuildSettings, User, UserTable
+from pevent.common.storage import STORAGES, JournalStorage
+
+
+def open_db(storage):
+    """Load the way `PEvent._initialize` does, starting empty if nothing was written yet"""
+    try:
+        db = storage.load()
+    except FileNotFoundError:
+        db = DB()
+        db.mark_dirty(dirty_global=True)
+    storage.attach(db)
+    return db
+
+
+def save(storage, db):
+    """One flush of the save scheduler"""
+    guild_ids, write_global = db.take_dirty()
+    writer = asyncio.run(storage.prepare(db, guild_ids, write_global))
+    return writer()
+
+
+def reopen(storage, db):
+    """Unload and load again from disk only"""
+    storage.detach(db)
+    storage.close()
+    fresh = type(storage)(storage.root)
+    return fresh, open_db(fresh)
+
+
+@pytest.mark.parametrize("mode", list(STORAGES))
+def test_round_trip(tmp_path, mode):
+    storage = STORAGES[mode](tmp_path)
+    db = open_db(storage)
+    user = db.get_conf(1).get_user(10)
+    user.user_total_setup = 3
+    user.has_active_deposit = True
+    user.last_deposit_at = 1_700_000_000
+    db.deposit_value = 500
+    save(storage, db)
+
+    # Changes after the first save only reach the second one
+    user.user_total_setup = 4
+    db.get_conf(1).get_user(11).user_total_complete = 2
+    db.get_conf(2).get_user(20).is_banned_from_host = True
+    save(storage, db)
+
+    storage, db = reopen(storage, db)
+    assert db.deposit_value == 500
+    first = db.get_conf(1)
+    assert first.peek_user(10).user_total_setup == 4
+    assert first.peek_user(10).has_active_deposit
+    assert first.peek_user(10).last_deposit_at == 1_700_000_000
+    assert first.peek_user(11).user_total_complete == 2
+    assert db.get_conf(2).peek_user(20).is_banned_from_host
+    assert sorted(first.users) == [10, 11]
+
+    # The reloaded database keeps saving
+    first.get_user(10).user_total_success = 1
+    save(storage, db)
+    storage, db = reopen(storage, db)
+    assert db.get_conf(1).peek_user(10).user_total_success == 1
+    storage.close()
+
+
+def test_journal_replay_after_compaction(tmp_path):
+    storage = JournalStorage(tmp_path)
+    db = open_db(storage)
+    conf = db.get_conf(1)
+    conf.get_user(10).user_total_setup = 1
+    # The first save writes the snapshot
+    save(storage, db)
+
+    conf.get_user(10).user_total_setup = 2
+    conf.get_user(11).user_total_cancelled = 1
+    save(storage, db)
+    assert storage.journal_size() > 0
+
+    storage.compact(db.snapshot())
+    assert storage.journal_size() == 0
+
+    conf.get_user(10).user_total_setup = 3
+    conf.get_user(12).can_make_deposit = True
+    save(storage, db)
+
+    storage, db = reopen(storage, db)
+    conf = db.get_conf(1)
+    assert conf.peek_user(10).user_total_setup == 3
+    assert conf.peek_user(11).user_total_cancelled == 1
+    assert conf.peek_user(12).can_make_deposit
+
+
+def test_journal_skips_torn_record(tmp_path):
+    storage = JournalStorage(tmp_path)
+    db = open_db(storage)
+    save(storage, db)
+    db.get_conf(1).get_user(10).user_total_setup = 5
+    save(storage, db)
+    with storage.journal.open("ab") as fs:
+        fs.write(b'{"g":1,"u":10,"f":"user_total_se')
+
+    storage, db = reopen(storage, db)
+    assert db.get_conf(1).peek_user(10).user_total_setup == 5
+
+
+def test_snapshot_is_point_in_time():
+    db = DB()
+    user = db.get_conf(1).get_user(10)
+    user.user_total_complete = 1
+    user.has_active_deposit = True
+    snapshot = db.snapshot()
+    # Changed on the loop before the writer thread serializes the guild
+    user.user_total_complete = 2
+    user.has_active_deposit = False
+    assert snapshot.guild_json(1) == b'{"users":{"10":{"user_total_complete":1,"has_active_deposit":true}}}'
+    assert db.snapshot().guild_json(1) == b'{"users":{"10":{"user_total_complete":2}}}'
+
+
+def test_user_table_dumps_match_model_dumps():
+    dump = json_serializer(User)
+    users = [User(), User(user_total_setup=3, can_make_deposit=True, last_deposit_at=1_700_000_000)]
+    users.append(User(**{name: 1 if field.annotation is int else True for name, field in User.model_fields.items()}))
+    table = UserTable.from_users(dict(enumerate(users)))
+    render = table.dumper()
+    del table[0]
+    for uid, user in enumerate(users):
+        assert render()[uid] == dump(user)
+        if uid:
+            assert table.dump(uid) == dump(user)
+            assert table[uid] == user
+
+
+def test_compacted_user_is_restored_by_its_view():
+    db = DB()
+    conf = db.get_conf(1)
+    conf.get_user(10).user_total_setup = 1
+    view = conf.get_user(20)
+    assert conf.compact() == [20]
+    view.user_total_setup = 2
+    assert db.snapshot().guild_json(1) == b'{"users":{"10":{"user_total_setup":1},"20":{"user_total_setup":2}}}'
+    assert conf.stats.setups == 3
+    assert GuildSettings.from_trusted_json(conf.model_dump_json().encode()).users == conf.users